@@ -1,9 +1,23 @@
 from setuptools import setup, find_packages
 
+try:
+    # Compile the automation walkers when Cython is available, the pure Python module is used otherwise
+    from Cython.Build import cythonize
+    ext_modules = cythonize(
+        ["src/automation/_walkers.py"],
+        compiler_directives={"language_level": 3},
+        quiet=True,
+    )
+    for extension in ext_modules:
+        extension.optional = True
+except ImportError:
+    ext_modules = []
+
 setup(
     name="home-assistant-mcp",
     version="0.1.0",
     packages=find_packages(),
+    ext_modules=ext_modules,
     install_requires=[
         "homeassistant-api>=4.0.0",
         "pyyaml>=6.0",
@@ -0,0 +1,109 @@
+"""
+Numeric kernels for automation pattern mining.
+
+These functions are compiled with Numba. This module is only imported on first
+use (see generator._get_kernel and pattern_discovery._get_sequence_kernel) so
+Numba's import and compile cost is not paid at startup.
+"""
+
+import numpy as np
+from numba import njit, prange
+
+# Explicit signatures so Numba can skip type inference on the first call. Timestamps
+# are int32 offsets, or int64 for histories too long to fit in int32.
+_CORRELATE_SIGNATURES = [
+    'Tuple((int32[:], int32[:], int64[:]))'
+    '(int32[:], int32[:], int32[:], int32[:], int64[:], int64)',
+    'Tuple((int32[:], int32[:], int64[:]))'
+    '(int64[:], int32[:], int64[:], int32[:], int64[:], int64)'
+]
+
+@njit(_CORRELATE_SIGNATURES, cache=True, parallel=True)
+def correlate(trigger_ts, trigger_labels, entity_ts, entity_state_ids, offsets, window):
+    """
+    Pair trigger events with the events of several entities that follow within a time window.
+    
+    The entities are stored back to back: entity e owns entity_ts[offsets[e]:offsets[e + 1]],
+    and each of these slices must be sorted in ascending order. Entities are processed in
+    parallel.
+    
+    Args:
+        trigger_ts (np.ndarray): Trigger event timestamps in seconds
+        trigger_labels (np.ndarray): Integer label of each trigger event, copied into its pairs
+        entity_ts (np.ndarray): Concatenated entity event timestamps in seconds
+        entity_state_ids (np.ndarray): Concatenated integer-coded entity states
+        offsets (np.ndarray): Start of each entity in the concatenated arrays, plus the total length
+        window (int): Maximum delay in seconds after the trigger
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Trigger labels and entity state IDs of each
+            correlated pair, and the start of each entity's pairs plus the total number of pairs
+    """
+    n_entities = offsets.shape[0] - 1
+    
+    # Count the pairs of each entity to give it a slice of the output
+    counts = np.zeros(n_entities + 1, dtype=np.int64)
+    for e in prange(n_entities):
+        ts = entity_ts[offsets[e]:offsets[e + 1]]
+        lo = np.searchsorted(ts, trigger_ts, side='left')
+        hi = np.searchsorted(ts, trigger_ts + window, side='right')
+        counts[e + 1] = (hi - lo).sum()
+    pair_offsets = np.cumsum(counts)
+    
+    out_trigger = np.empty(pair_offsets[-1], dtype=np.int32)
+    out_action = np.empty(pair_offsets[-1], dtype=np.int32)
+    
+    # Fill every entity's slice independently
+    for e in prange(n_entities):
+        start = offsets[e]
+        ts = entity_ts[start:offsets[e + 1]]
+        lo = np.searchsorted(ts, trigger_ts, side='left')
+        hi = np.searchsorted(ts, trigger_ts + window, side='right')
+        k = pair_offsets[e]
+        for i in range(trigger_ts.shape[0]):
+            for j in range(lo[i], hi[i]):
+                out_trigger[k] = trigger_labels[i]
+                out_action[k] = entity_state_ids[start + j]
+                k += 1
+    
+    return out_trigger, out_action, pair_offsets
+
+@njit('int64(int64[:], int64[:], int64[:], int64[:], int64)', cache=True)
+def count_sequence(timestamps, order, key_offsets, steps, window):
+    """
+    Count the occurrences of a sequence of (entity, state) keys in a sorted timeline.
+    
+    An occurrence starts at an entry with the first key, and every other key must have an
+    entry later in the timeline within the time window of that start. The entries of key k
+    are at timeline positions order[key_offsets[k]:key_offsets[k + 1]], in ascending order.
+    
+    Args:
+        timestamps (np.ndarray): Timestamps of the timeline entries, in ascending order
+        order (np.ndarray): Timeline positions grouped by key
+        key_offsets (np.ndarray): Start of each key's positions in order, plus the total length
+        steps (np.ndarray): Key of each step of the sequence
+        window (int): Maximum delay after the start, in the unit of the timestamps
+    
+    Returns:
+        int: Number of occurrences
+    """
+    starts = order[key_offsets[steps[0]]:key_offsets[steps[0] + 1]]
+    count = 0
+    
+    for s in range(starts.shape[0]):
+        start = starts[s]
+        deadline = timestamps[start] + window
+        matched = True
+        
+        # The first entry of a step after the start is its earliest one
+        for j in range(1, steps.shape[0]):
+            positions = order[key_offsets[steps[j]]:key_offsets[steps[j] + 1]]
+            k = np.searchsorted(positions, start, side='right')
+            if k == positions.shape[0] or timestamps[positions[k]] > deadline:
+                matched = False
+                break
+        
+        if matched:
+            count += 1
+    
+    return count
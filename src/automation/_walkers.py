@@ -0,0 +1,158 @@
+"""
+Trigger and action walkers for automation configurations.
+
+These functions are plain Python. setup.py compiles this module with Cython
+when Cython is installed; the compiled extension is then imported in place of
+this file, and the pure Python version is used otherwise.
+"""
+
+from typing import Dict, List, Any, Optional, Sequence, Set
+
+def as_list(value: Any) -> List[Any]:
+    """
+    Normalize a trigger or action section, which may be a single item, to a list.
+    
+    Args:
+        value (Any): Trigger or action section of an automation
+    
+    Returns:
+        List[Any]: The section as a list
+    """
+    return value if isinstance(value, list) else [value]
+
+def _format_state_trigger(t: Dict[str, Any]) -> Dict[str, Any]:
+    """Format a state trigger for display."""
+    return {
+        'type': 'state',
+        'entity': t.get('entity_id', ''),
+        'to': t.get('to', ''),
+        'from': t.get('from', '')
+    }
+
+def _format_time_trigger(t: Dict[str, Any]) -> Dict[str, Any]:
+    """Format a time trigger for display."""
+    return {'type': 'time', 'at': t.get('at', '')}
+
+def _format_other_trigger(t: Dict[str, Any]) -> Dict[str, Any]:
+    """Format a trigger of any other platform for display."""
+    return {'type': t.get('platform', 'unknown')}
+
+def _format_service_action(a: Dict[str, Any]) -> Dict[str, Any]:
+    """Format a service call action for display."""
+    action_info = {'type': 'service', 'service': a.get('service', '')}
+    
+    # Get entity IDs
+    if 'entity_id' in a:
+        action_info['entities'] = [a['entity_id']]
+    elif 'target' in a and 'entity_id' in a['target']:
+        entity_id = a['target']['entity_id']
+        if isinstance(entity_id, list):
+            action_info['entities'] = entity_id
+        else:
+            action_info['entities'] = [entity_id]
+    else:
+        action_info['entities'] = []
+    
+    return action_info
+
+def _format_other_action(a: Dict[str, Any]) -> Dict[str, Any]:
+    """Format an action of any other type for display."""
+    return {'type': 'unknown'}
+
+# Display formatter for each trigger platform and action type
+_TRIGGER_FORMATTERS = {
+    'state': _format_state_trigger,
+    'time': _format_time_trigger
+}
+_ACTION_FORMATTERS = {
+    'service': _format_service_action
+}
+
+def format_automation(automation: Dict[str, Any], triggers: Optional[Sequence[Any]] = None,
+                      actions: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    """
+    Format an automation for display to the user.
+    
+    Args:
+        automation (Dict[str, Any]): Automation configuration
+        triggers (Optional[Sequence[Any]]): Triggers already normalized to a sequence
+        actions (Optional[Sequence[Any]]): Actions already normalized to a sequence
+    
+    Returns:
+        Dict[str, Any]: Formatted automation
+    """
+    # Create a simplified view of the automation
+    formatted = {
+        'id': automation.get('id', ''),
+        'alias': automation.get('alias', 'Unnamed Automation'),
+        'description': automation.get('description', ''),
+        'enabled': automation.get('enabled', True)
+    }
+    
+    if triggers is None:
+        triggers = as_list(automation.get('trigger', []))
+    if actions is None:
+        actions = as_list(automation.get('action', []))
+    
+    # Add trigger information
+    formatted['triggers'] = [
+        _TRIGGER_FORMATTERS.get(t.get('platform'), _format_other_trigger)(t)
+        for t in triggers
+        if isinstance(t, dict)
+    ]
+    
+    # Add action information
+    formatted['actions'] = [
+        _ACTION_FORMATTERS.get('service' if 'service' in a else None, _format_other_action)(a)
+        for a in actions
+        if isinstance(a, dict)
+    ]
+    
+    return formatted
+
+def referenced_entities(automation: Dict[str, Any], triggers: Optional[Sequence[Any]] = None,
+                        actions: Optional[Sequence[Any]] = None) -> Set[str]:
+    """
+    Collect the entity IDs referenced by an automation's triggers and actions.
+    
+    Args:
+        automation (Dict[str, Any]): Automation configuration
+        triggers (Optional[Sequence[Any]]): Triggers already normalized to a sequence
+        actions (Optional[Sequence[Any]]): Actions already normalized to a sequence
+    
+    Returns:
+        Set[str]: Entity IDs of the triggers, and of the actions and their targets
+    """
+    if triggers is None:
+        triggers = as_list(automation.get('trigger', []))
+    if actions is None:
+        actions = as_list(automation.get('action', []))
+    
+    entity_ids = set()
+    
+    # Check triggers
+    for t in triggers:
+        if isinstance(t, dict) and isinstance(t.get('entity_id'), str):
+            entity_ids.add(t['entity_id'])
+    
+    # Check actions
+    for a in actions:
+        if not isinstance(a, dict):
+            continue
+        
+        # Check direct entity_id
+        if isinstance(a.get('entity_id'), str):
+            entity_ids.add(a['entity_id'])
+        
+        # Check target.entity_id
+        target = a.get('target')
+        if isinstance(target, dict):
+            target_entities = target.get('entity_id')
+            if isinstance(target_entities, list):
+                for e in target_entities:
+                    if isinstance(e, str):
+                        entity_ids.add(e)
+            elif isinstance(target_entities, str):
+                entity_ids.add(target_entities)
+    
+    return entity_ids
@@ -5,16 +5,211 @@ This module handles analyzing usage patterns and generating automation configura
 """
 
 import logging
+import heapq
+from operator import attrgetter
 import yaml
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
-from collections import defaultdict
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple, NamedTuple
+from collections import Counter
+
+from src.automation.utils import parse_timestamps_us
+
+try:
+    # Use the libyaml C emitter when PyYAML was built with it
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
 
 logger = logging.getLogger(__name__)
 
+# Domains whose entities cannot be controlled by an automation
+_NON_CONTROLLABLE = frozenset({'sensor', 'binary_sensor', 'sun', 'weather'})
+
+# Domains whose state changes can trigger an automation
+_TRIGGER_DOMAINS = frozenset({'binary_sensor', 'sensor', 'device_tracker', 'person'})
+
+# Correlation kernel, resolved on first use so importing this module stays cheap
+_kernel = None
+
+def _get_kernel():
+    """
+    Get the Numba correlation kernel, importing it on first use.
+    
+    Returns:
+        Callable: The compiled kernel, or _correlate_python when Numba is not installed
+    """
+    global _kernel
+    if _kernel is None:
+        try:
+            from src.automation._kernels import correlate
+            _kernel = correlate
+        except ImportError:
+            logger.info("Numba is not installed, using pure Python pattern correlation")
+            _kernel = _correlate_python
+    return _kernel
+
+def _correlate_python(trigger_ts: np.ndarray, trigger_labels: np.ndarray, entity_ts: np.ndarray,
+                      entity_state_ids: np.ndarray, offsets: np.ndarray,
+                      window: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    NumPy version of _kernels.correlate, used when JIT compilation is off.
+    
+    Args:
+        trigger_ts (np.ndarray): Trigger event timestamps in seconds
+        trigger_labels (np.ndarray): Integer label of each trigger event, copied into its pairs
+        entity_ts (np.ndarray): Concatenated entity event timestamps in seconds
+        entity_state_ids (np.ndarray): Concatenated integer-coded entity states
+        offsets (np.ndarray): Start of each entity in the concatenated arrays, plus the total length
+        window (int): Maximum delay in seconds after the trigger
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Same as _kernels.correlate
+    """
+    n_entities = len(offsets) - 1
+    window_end = trigger_ts + window
+    
+    # Locate the window of every trigger inside every entity's slice
+    bounds = []
+    pair_offsets = np.zeros(n_entities + 1, dtype=np.int64)
+    for e in range(n_entities):
+        start, end = offsets[e], offsets[e + 1]
+        lo = np.searchsorted(entity_ts[start:end], trigger_ts, side='left') + start
+        hi = np.searchsorted(entity_ts[start:end], window_end, side='right') + start
+        counts = hi - lo
+        bounds.append((lo, counts))
+        pair_offsets[e + 1] = pair_offsets[e] + counts.sum()
+    
+    out_trigger = np.empty(pair_offsets[-1], dtype=np.int32)
+    out_action = np.empty(pair_offsets[-1], dtype=np.int32)
+    
+    # Expand each [lo, hi) window into entity indices without a Python loop per pair
+    for e, (lo, counts) in enumerate(bounds):
+        total = pair_offsets[e + 1] - pair_offsets[e]
+        if not total:
+            continue
+        pair_starts = np.cumsum(counts) - counts
+        entity_index = np.repeat(lo - pair_starts, counts) + np.arange(total)
+        out_trigger[pair_offsets[e]:pair_offsets[e + 1]] = np.repeat(trigger_labels, counts)
+        out_action[pair_offsets[e]:pair_offsets[e + 1]] = entity_state_ids[entity_index]
+    
+    return out_trigger, out_action, pair_offsets
+
+class Pattern(NamedTuple):
+    """Automation pattern found by AutomationGenerator."""
+    
+    entity_id: str
+    type: str
+    action_state: Any
+    confidence: float
+    occurrences: int
+    trigger_time: Optional[str] = None
+    trigger_entity: Optional[str] = None
+    trigger_state: Any = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the pattern to the dictionary format returned by analyze_entity_usage.
+        
+        Returns:
+            Dict[str, Any]: Pattern with only the trigger fields of its type
+        """
+        if self.type == 'time':
+            return {
+                'entity_id': self.entity_id,
+                'type': self.type,
+                'trigger_time': self.trigger_time,
+                'action_state': self.action_state,
+                'confidence': self.confidence,
+                'occurrences': self.occurrences
+            }
+        return {
+            'entity_id': self.entity_id,
+            'type': self.type,
+            'trigger_entity': self.trigger_entity,
+            'trigger_state': self.trigger_state,
+            'action_state': self.action_state,
+            'confidence': self.confidence,
+            'occurrences': self.occurrences
+        }
+
+def _toggle_action(entity_id: str, action_state: Any, domain: str) -> Dict[str, Any]:
+    """
+    Build a turn_on/turn_off action for on/off entities.
+    
+    Args:
+        entity_id (str): Entity ID
+        action_state (Any): Target state
+        domain (str): Entity domain
+    
+    Returns:
+        Dict[str, Any]: Automation action
+    """
+    service = f"{domain}.turn_on" if action_state == 'on' else f"{domain}.turn_off"
+    return {
+        'service': service,
+        'target': {
+            'entity_id': entity_id
+        }
+    }
+
+def _climate_action(entity_id: str, action_state: Any, domain: str) -> Dict[str, Any]:
+    """
+    Build a set_hvac_mode action for climate entities.
+    
+    Args:
+        entity_id (str): Entity ID
+        action_state (Any): Target HVAC mode
+        domain (str): Entity domain
+    
+    Returns:
+        Dict[str, Any]: Automation action
+    """
+    # For climate entities, we need more information (like temperature)
+    return {
+        'service': 'climate.set_hvac_mode',
+        'target': {
+            'entity_id': entity_id
+        },
+        'data': {
+            'hvac_mode': action_state
+        }
+    }
+
+def _generic_action(entity_id: str, action_state: Any, domain: str) -> Dict[str, Any]:
+    """
+    Build a generic set_state action for any other domain.
+    
+    Args:
+        entity_id (str): Entity ID
+        action_state (Any): Target state
+        domain (str): Entity domain
+    
+    Returns:
+        Dict[str, Any]: Automation action
+    """
+    return {
+        'service': f"{domain}.set_state",
+        'target': {
+            'entity_id': entity_id
+        },
+        'data': {
+            'state': action_state
+        }
+    }
+
 class AutomationGenerator:
     """Class for generating Home Assistant automations."""
     
+    # Action builder for each entity domain, other domains use _generic_action
+    _ACTION_BUILDERS = {
+        'light': _toggle_action,
+        'switch': _toggle_action,
+        'fan': _toggle_action,
+        'cover': _toggle_action,
+        'climate': _climate_action
+    }
+    
     def __init__(self, config: Dict[str, Any]):
         """
         Initialize the automation generator.
@@ -25,6 +220,7 @@ class AutomationGenerator:
         self.config = config
         self.suggestion_threshold = config['automation'].get('suggestion_threshold', 3)
         self.max_suggestions = config['automation'].get('max_suggestions', 5)
+        self.use_jit = config['automation'].get('jit', True)
     
     def analyze_entity_usage(self, history_data) -> List[Dict[str, Any]]:
         """
@@ -40,173 +236,386 @@ class AutomationGenerator:
         
         # Handle both input formats: list format and dictionary format
         if isinstance(history_data, list):
-            # Group history data by entity (legacy format)
-            entity_history = defaultdict(list)
-            for item in history_data:
-                entity_id = item.get('entity_id')
-                if entity_id:
-                    entity_history[entity_id].append(item)
+            # Bucket the flat list by entity straight into arrays (legacy format)
+            parsed_history = self._parse_history_list(history_data)
         elif isinstance(history_data, dict):
-            # Dictionary format (already grouped by entity_id)
-            entity_history = history_data
+            # Dictionary format (already grouped by entity_id), skipping entities with too little history
+            parsed_history = self._parse_entity_history({
+                entity_id: history
+                for entity_id, history in history_data.items()
+                if len(history) >= self.suggestion_threshold
+            })
         else:
             logger.error(f"Unsupported history_data format: {type(history_data)}")
             return []
         
+        domains = {entity_id: entity_id.partition('.')[0] for entity_id in parsed_history}
+        triggers = self._viable_triggers(parsed_history, domains)
+        
+        # Look for state-based patterns (entity state changes based on other entities),
+        # skipping non-controllable entities (sensors, etc.)
+        state_patterns = self._find_all_state_patterns({
+            entity_id: parsed
+            for entity_id, parsed in parsed_history.items()
+            if domains[entity_id] not in _NON_CONTROLLABLE
+        }, triggers)
+        
         # Analyze each entity's history
-        for entity_id, history in entity_history.items():
-            # Skip entities with too little history
-            if len(history) < self.suggestion_threshold:
-                continue
-            
+        for entity_id, parsed in parsed_history.items():
             # Look for time-based patterns
-            time_patterns = self._find_time_patterns(entity_id, history)
+            time_patterns = self._find_time_patterns(entity_id, parsed)
             if time_patterns:
                 patterns.extend(time_patterns)
             
-            # Look for state-based patterns (entity state changes based on other entities)
-            state_patterns = self._find_state_patterns(entity_id, history, entity_history)
-            if state_patterns:
-                patterns.extend(state_patterns)
-        
-        # Sort patterns by confidence and limit to max_suggestions
-        patterns.sort(key=lambda x: x.get('confidence', 0), reverse=True)
-        return patterns[:self.max_suggestions]
+            if state_patterns.get(entity_id):
+                patterns.extend(state_patterns[entity_id])
+        
+        # Keep the max_suggestions patterns with the highest confidence
+        top_patterns = heapq.nlargest(self.max_suggestions, patterns, key=attrgetter('confidence'))
+        return [pattern.to_dict() for pattern in top_patterns]
     
-    def _find_time_patterns(self, entity_id: str, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _find_time_patterns(self, entity_id: str, parsed: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]) -> List[Pattern]:
         """
         Find time-based patterns for an entity.
         
         Args:
             entity_id (str): Entity ID
-            history (List[Dict[str, Any]]): Entity history data
+            parsed (Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]): Entity history parsed by _parse_entity_history
             
         Returns:
-            List[Dict[str, Any]]: List of time-based patterns
+            List[Pattern]: List of time-based patterns
         """
         patterns = []
         
-        # Group state changes by time of day
-        time_buckets = defaultdict(list)
-        for entry in history:
-            if 'last_changed' in entry and 'state' in entry:
-                try:
-                    timestamp = datetime.fromisoformat(entry['last_changed'].replace('Z', '+00:00'))
-                    hour = timestamp.hour
-                    time_bucket = f"{hour:02d}:00"
-                    time_buckets[time_bucket].append(entry)
-                except (ValueError, TypeError):
-                    continue
+        _, hours, state_ids, positions, state_names = parsed
+        if not len(hours):
+            return patterns
+        
+        # Sort by hour so every time bucket is a contiguous slice
+        order = np.argsort(hours, kind='stable')
+        hours = hours[order]
+        state_ids = state_ids[order]
+        bucket_hours, bucket_starts, bucket_sizes = np.unique(hours, return_index=True, return_counts=True)
+        
+        # Visit the buckets in the order their first entry appears in the history, so patterns
+        # with equal confidence keep that order even if the history is not chronological
+        first_positions = np.minimum.reduceat(positions[order], bucket_starts)
+        by_first_event = np.argsort(first_positions, kind='stable')
+        bucket_hours = bucket_hours[by_first_event]
+        bucket_starts = bucket_starts[by_first_event]
+        bucket_sizes = bucket_sizes[by_first_event]
         
         # Look for consistent state changes at specific times
-        for time_bucket, entries in time_buckets.items():
-            if len(entries) >= self.suggestion_threshold:
+        for hour, start, size in zip(bucket_hours.tolist(), bucket_starts.tolist(), bucket_sizes.tolist()):
+            if size >= self.suggestion_threshold:
                 # Check if state changes are consistent
-                states = [entry['state'] for entry in entries]
-                most_common_state = max(set(states), key=states.count)
-                confidence = states.count(most_common_state) / len(states)
+                state_counts = np.bincount(state_ids[start:start + size])
+                most_common_id = int(state_counts.argmax())
+                confidence = int(state_counts[most_common_id]) / size
                 
                 if confidence >= 0.7:  # At least 70% confidence
-                    pattern = {
-                        'entity_id': entity_id,
-                        'type': 'time',
-                        'trigger_time': time_bucket,
-                        'action_state': most_common_state,
-                        'confidence': confidence,
-                        'occurrences': len(entries)
-                    }
-                    patterns.append(pattern)
+                    patterns.append(Pattern(
+                        entity_id=entity_id,
+                        type='time',
+                        trigger_time=f"{hour:02d}:00",
+                        action_state=state_names[most_common_id],
+                        confidence=confidence,
+                        occurrences=size
+                    ))
         
         return patterns
     
-    def _find_state_patterns(self, entity_id: str, history: List[Dict[str, Any]], 
-                             all_entity_history: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    def _viable_triggers(self, parsed_history: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]],
+                         domains: Optional[Dict[str, str]] = None) -> List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Select the entities that can trigger a state-based pattern.
+        
+        Args:
+            parsed_history (Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]): All entities parsed history data
+            domains (Dict[str, str], optional): Domain of each entity in parsed_history
+        
+        Returns:
+            List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]: Entity ID, timestamps, state IDs and
+                positions in the history of each trigger
+        """
+        if domains is None:
+            domains = {entity_id: entity_id.partition('.')[0] for entity_id in parsed_history}
+        
+        # Only trigger domains with enough history can produce a pattern
+        return [
+            (entity_id, timestamps, state_ids, positions)
+            for entity_id, (timestamps, _, state_ids, positions, _) in parsed_history.items()
+            if len(timestamps) >= self.suggestion_threshold and domains[entity_id] in _TRIGGER_DOMAINS
+        ]
+    
+    def _find_state_patterns(self, entity_id: str, parsed: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]], 
+                             triggers: List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]) -> List[Pattern]:
         """
         Find state-based patterns between entities.
         
+        The caller is expected to skip non-controllable entities (sensors, etc.).
+        
         Args:
             entity_id (str): Entity ID
-            history (List[Dict[str, Any]]): Entity history data
-            all_entity_history (Dict[str, List[Dict[str, Any]]]): All entities history data
+            parsed (Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]): Entity history parsed by _parse_entity_history
+            triggers (List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]): Candidate trigger entities from _viable_triggers
             
         Returns:
-            List[Dict[str, Any]]: List of state-based patterns
+            List[Pattern]: List of state-based patterns
         """
-        patterns = []
+        return self._find_all_state_patterns({entity_id: parsed}, triggers)[entity_id]
+    
+    def _find_all_state_patterns(self, entities: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]],
+                                 triggers: List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]) -> Dict[str, List[Pattern]]:
+        """
+        Find state-based patterns for several entities at once.
+        
+        Each trigger is correlated with all entities in a single kernel call, which
+        runs over the entities in parallel when JIT compilation is enabled and Numba
+        is available.
+        
+        Args:
+            entities (Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]): Controllable entities parsed history data
+            triggers (List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]): Candidate trigger entities from _viable_triggers
         
-        # Skip non-controllable entities (sensors, etc.)
-        entity_domain = entity_id.split('.')[0]
-        if entity_domain in ['sensor', 'binary_sensor', 'sun', 'weather']:
+        Returns:
+            Dict[str, List[Pattern]]: List of state-based patterns by entity ID
+        """
+        patterns = {entity_id: [] for entity_id in entities}
+        
+        entity_ids = [entity_id for entity_id, (timestamps, _, _, _, _) in entities.items() if len(timestamps)]
+        if not entity_ids or not triggers:
             return patterns
         
-        # Look for correlations with other entities
-        for trigger_entity_id, trigger_history in all_entity_history.items():
-            # Skip if this is the same entity or not enough history
-            if trigger_entity_id == entity_id or len(trigger_history) < self.suggestion_threshold:
-                continue
-            
-            # Skip non-trigger entities
-            trigger_domain = trigger_entity_id.split('.')[0]
-            if trigger_domain not in ['binary_sensor', 'sensor', 'device_tracker', 'person']:
-                continue
+        # Lay the entities out back to back for the kernel
+        state_names = entities[entity_ids[0]][4]
+        n_states = len(state_names)
+        entity_ts = np.concatenate([entities[entity_id][0] for entity_id in entity_ids])
+        entity_state_ids = np.concatenate([entities[entity_id][2] for entity_id in entity_ids])
+        offsets = np.zeros(len(entity_ids) + 1, dtype=np.int64)
+        np.cumsum([len(entities[entity_id][0]) for entity_id in entity_ids], out=offsets[1:])
+        
+        correlate = _get_kernel() if self.use_jit else _correlate_python
+        
+        for trigger_entity_id, trigger_ts, trigger_state_ids, trigger_positions in triggers:
+            # Look for state changes of each entity 0-60 seconds after state changes in trigger_entity_id,
+            # labelling each pair with the index of its trigger event
+            all_trigger_events, all_action_ids, pair_offsets = correlate(
+                trigger_ts, np.arange(len(trigger_ts), dtype=np.int32), entity_ts, entity_state_ids, offsets, 60
+            )
+            pair_offsets = pair_offsets.tolist()
             
-            # Look for state changes in entity_id that follow state changes in trigger_entity_id
-            correlations = []
-            for trigger_entry in trigger_history:
-                if 'last_changed' not in trigger_entry or 'state' not in trigger_entry:
+            for i, entity_id in enumerate(entity_ids):
+                # Skip if this is the same entity
+                if entity_id == trigger_entity_id:
                     continue
                 
-                try:
-                    trigger_time = datetime.fromisoformat(trigger_entry['last_changed'].replace('Z', '+00:00'))
-                    trigger_state = trigger_entry['state']
-                    
-                    # Look for entity changes within 1 minute after trigger
-                    for entry in history:
-                        if 'last_changed' not in entry or 'state' not in entry:
-                            continue
-                        
-                        entity_time = datetime.fromisoformat(entry['last_changed'].replace('Z', '+00:00'))
-                        time_diff = (entity_time - trigger_time).total_seconds()
-                        
-                        # If entity changed 0-60 seconds after trigger
-                        if 0 <= time_diff <= 60:
-                            correlations.append({
-                                'trigger_entity': trigger_entity_id,
-                                'trigger_state': trigger_state,
-                                'action_state': entry['state'],
-                                'time_diff': time_diff
-                            })
-                except (ValueError, TypeError):
-                    continue
-            
-            # If we found consistent correlations
-            if len(correlations) >= self.suggestion_threshold:
-                # Group by trigger state
-                triggers = defaultdict(list)
-                for corr in correlations:
-                    key = (corr['trigger_entity'], corr['trigger_state'])
-                    triggers[key].append(corr['action_state'])
+                start, end = pair_offsets[i], pair_offsets[i + 1]
                 
-                # Check for consistent state changes
-                for (trigger_entity, trigger_state), action_states in triggers.items():
-                    if len(action_states) >= self.suggestion_threshold:
-                        most_common_state = max(set(action_states), key=action_states.count)
-                        confidence = action_states.count(most_common_state) / len(action_states)
+                # If we found consistent correlations
+                if end - start >= self.suggestion_threshold:
+                    trigger_events = all_trigger_events[start:end]
+                    trigger_ids = trigger_state_ids[trigger_events]
+                    action_ids = all_action_ids[start:end]
+                    
+                    # Count each (trigger state, action state) pair, sorted by trigger state
+                    pair_codes, pair_index, pair_counts = np.unique(
+                        trigger_ids.astype(np.int64) * n_states + action_ids,
+                        return_inverse=True, return_counts=True
+                    )
+                    pair_triggers = pair_codes // n_states
+                    
+                    # Earliest trigger event of each pair in the history, which need not be chronological
+                    first_index = np.full(len(pair_codes), np.iinfo(np.int32).max, dtype=np.int32)
+                    np.minimum.at(first_index, pair_index, trigger_positions[trigger_events])
+                    
+                    # Reduce the pairs of each trigger state
+                    group_starts = np.flatnonzero(np.r_[True, pair_triggers[1:] != pair_triggers[:-1]])
+                    totals = np.add.reduceat(pair_counts, group_starts).tolist()
+                    best_counts = np.maximum.reduceat(pair_counts, group_starts).tolist()
+                    first_seen = np.minimum.reduceat(first_index, group_starts)
+                    group_starts = group_starts.tolist() + [len(pair_codes)]
+                    
+                    # Check for consistent state changes per trigger state, in order of appearance
+                    for group in np.argsort(first_seen).tolist():
+                        total = totals[group]
                         
-                        if confidence >= 0.7:  # At least 70% confidence
-                            pattern = {
-                                'entity_id': entity_id,
-                                'type': 'state',
-                                'trigger_entity': trigger_entity,
-                                'trigger_state': trigger_state,
-                                'action_state': most_common_state,
-                                'confidence': confidence,
-                                'occurrences': len(action_states)
-                            }
-                            patterns.append(pattern)
+                        if total >= self.suggestion_threshold:
+                            confidence = best_counts[group] / total
+                            
+                            if confidence >= 0.7:  # At least 70% confidence
+                                start, end = group_starts[group], group_starts[group + 1]
+                                best_code = int(pair_codes[start + pair_counts[start:end].argmax()])
+                                patterns[entity_id].append(Pattern(
+                                    entity_id=entity_id,
+                                    type='state',
+                                    trigger_entity=trigger_entity_id,
+                                    trigger_state=state_names[best_code // n_states],
+                                    action_state=state_names[best_code % n_states],
+                                    confidence=confidence,
+                                    occurrences=total
+                                ))
         
         return patterns
     
+    def _parse_entity_history(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]:
+        """
+        Parse the history of several entities, interning states to shared integer IDs.
+        
+        Args:
+            entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
+        
+        Returns:
+            Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]: Timestamps in seconds (see
+                _compact_timestamps), local hour of day (int8), state IDs (int32), position in the
+                history (int32) and the state value of each ID, by entity ID
+        """
+        state_to_id = {}
+        columns = {
+            entity_id: self._parse_history(history, state_to_id)
+            for entity_id, history in entity_history.items()
+        }
+        
+        # All entities share one ID space so their state IDs can be compared directly
+        id_to_state = list(state_to_id)
+        
+        return self._compact_timestamps({
+            entity_id: (timestamps, hours, state_ids, positions, id_to_state)
+            for entity_id, (timestamps, hours, state_ids, positions) in columns.items()
+        })
+    
+    def _parse_history(self, history: List[Dict[str, Any]], state_to_id: Dict[Any, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Parse an entity history into timestamp-sorted columns.
+        
+        Args:
+            history (List[Dict[str, Any]]): Entity history data
+            state_to_id (Dict[Any, int]): Interning table mapping state values to IDs, extended in place
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Columns as returned by _sort_columns
+        """
+        entries = [entry for entry in history if 'last_changed' in entry and 'state' in entry]
+        ts, wall, valid = parse_timestamps_us([entry['last_changed'] for entry in entries])
+        get_id = state_to_id.setdefault
+        state_ids = np.fromiter(
+            (get_id(entry['state'], len(state_to_id)) for entry in entries),
+            dtype=np.int32, count=len(entries)
+        )
+        
+        return self._sort_columns(ts, wall, valid, state_ids)
+    
+    def _parse_history_list(self, history_data: List[Dict[str, Any]]) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]:
+        """
+        Parse a flat list of history entries from several entities.
+        
+        Entries are bucketed by entity into preallocated columns in two passes,
+        without building a list of entries per entity.
+        
+        Args:
+            history_data (List[Dict[str, Any]]): History entries, each with an entity_id
+        
+        Returns:
+            Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]: Same format as _parse_entity_history
+        """
+        # First pass: count the entries of each entity
+        counts = Counter(item.get('entity_id') for item in history_data)
+        
+        # Give every entity with enough history a contiguous slice of the shared columns
+        offsets = {}
+        total = 0
+        for entity_id, count in counts.items():
+            if entity_id and count >= self.suggestion_threshold:
+                offsets[entity_id] = total
+                total += count
+        
+        raw_timestamps = ['NaT'] * total
+        state_ids = np.empty(total, dtype=np.int32)
+        state_to_id = {}
+        get_id = state_to_id.setdefault
+        
+        # Second pass: fill each entity's slice in arrival order
+        cursor = dict(offsets)
+        for item in history_data:
+            entity_id = item.get('entity_id')
+            pos = cursor.get(entity_id)
+            if pos is None:
+                continue
+            cursor[entity_id] = pos + 1
+            
+            if 'last_changed' in item and 'state' in item:
+                raw_timestamps[pos] = item['last_changed']
+                state_ids[pos] = get_id(item['state'], len(state_to_id))
+            else:
+                # Left as NaT so it is dropped with the unparseable timestamps
+                state_ids[pos] = -1
+        
+        ts, wall, valid = parse_timestamps_us(raw_timestamps)
+        id_to_state = list(state_to_id)
+        
+        parsed_history = {}
+        for entity_id, start in offsets.items():
+            end = start + counts[entity_id]
+            parsed_history[entity_id] = self._sort_columns(
+                ts[start:end], wall[start:end], valid[start:end], state_ids[start:end]
+            ) + (id_to_state,)
+        
+        return self._compact_timestamps(parsed_history)
+    
+    def _compact_timestamps(self, parsed_history: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]:
+        """
+        Shrink epoch timestamps to int32 offsets from midnight (UTC) of the first day in the history.
+        
+        Only differences between timestamps are used, so the offsets work the same way.
+        Histories spanning more than 68 years keep int64 offsets.
+        
+        Args:
+            parsed_history (Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]): Parsed history with epoch timestamps
+        
+        Returns:
+            Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Any]]]: Parsed history with timestamp offsets
+        """
+        # Timestamps are sorted, so the first and last entries bound each entity
+        non_empty = [timestamps for timestamps, _, _, _, _ in parsed_history.values() if len(timestamps)]
+        first = min((int(timestamps[0]) for timestamps in non_empty), default=0)
+        last = max((int(timestamps[-1]) for timestamps in non_empty), default=0)
+        
+        origin = first - first % 86400
+        dtype = np.int32 if last - origin <= np.iinfo(np.int32).max else np.int64
+        
+        return {
+            entity_id: ((timestamps - origin).astype(dtype), hours, state_ids, positions, id_to_state)
+            for entity_id, (timestamps, hours, state_ids, positions, id_to_state) in parsed_history.items()
+        }
+    
+    def _sort_columns(self, ts: np.ndarray, wall: np.ndarray, valid: np.ndarray,
+                      state_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Drop unparseable timestamps and order events chronologically.
+        
+        State correlation measures the delay between events, so it works on UTC instants.
+        Time patterns bucket events by the hour of day written in the timestamp, which
+        comes from the wall-clock time, and order the buckets by position in the history.
+        
+        Args:
+            ts (np.ndarray): UTC instants in microseconds, from parse_timestamps_us
+            wall (np.ndarray): Wall-clock times in microseconds, from parse_timestamps_us
+            valid (np.ndarray): Mask of the timestamps that could be parsed
+            state_ids (np.ndarray): State ID of each event
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Epoch timestamps in seconds (int64),
+                local hour of day (int8), state IDs and position of each event in the history (int32),
+                sorted by time
+        """
+        seconds = ts[valid] // 1_000_000
+        hours = (wall[valid] // 3_600_000_000 % 24).astype(np.int8)
+        state_ids = state_ids[valid]
+        positions = np.flatnonzero(valid).astype(np.int32)
+        order = np.argsort(seconds, kind='stable')
+        
+        return seconds[order], hours[order], state_ids[order], positions[order]
+    
     def generate_automation_yaml(self, pattern: Dict[str, Any]) -> str:
         """
         Generate YAML for an automation based on a detected pattern.
@@ -220,8 +629,13 @@ class AutomationGenerator:
         entity_id = pattern.get('entity_id')
         pattern_type = pattern.get('type')
         
+        # Plain integer formatting is cheaper than strftime when generating in bulk
+        now = datetime.now()
+        timestamp = f"{now.year:04d}{now.month:02d}{now.day:02d}{now.hour:02d}{now.minute:02d}{now.second:02d}"
+        entity_slug = entity_id.replace('.', '_')
+        
         automation = {
-            'id': f"auto_{pattern_type}_{entity_id.replace('.', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            'id': f"auto_{pattern_type}_{entity_slug}_{timestamp}",
             'alias': f"Auto-generated {pattern_type} automation for {entity_id}",
             'description': f"Automatically generated {pattern_type}-based automation for {entity_id}",
             'mode': 'single'
@@ -242,44 +656,16 @@ class AutomationGenerator:
             }
         
         # Set up action based on entity domain
-        domain = entity_id.split('.')[0]
+        domain = entity_id.partition('.')[0]
         action_state = pattern.get('action_state')
         
-        if domain in ['light', 'switch', 'fan', 'cover']:
-            service = f"{domain}.turn_on" if action_state == 'on' else f"{domain}.turn_off"
-            automation['action'] = {
-                'service': service,
-                'target': {
-                    'entity_id': entity_id
-                }
-            }
-        elif domain == 'climate':
-            # For climate entities, we need more information (like temperature)
-            automation['action'] = {
-                'service': 'climate.set_hvac_mode',
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'hvac_mode': action_state
-                }
-            }
-        else:
-            # Generic service call for other domains
-            automation['action'] = {
-                'service': f"{domain}.set_state",
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'state': action_state
-                }
-            }
+        build_action = self._ACTION_BUILDERS.get(domain, _generic_action)
+        automation['action'] = build_action(entity_id, action_state, domain)
         
         # Add condition with a time allowance if it's a state-based trigger
         if pattern_type == 'state':
             automation['condition'] = []
         
         # Convert to YAML
-        yaml_content = yaml.dump(automation, sort_keys=False, default_flow_style=False)
+        yaml_content = yaml.dump(automation, Dumper=YamlDumper, sort_keys=False, default_flow_style=False)
         return yaml_content
\ No newline at end of file
@@ -5,22 +5,158 @@ This module handles managing Home Assistant automations, including
 reading, creating, updating, and deleting automations.
 """
 
+import hashlib
 import logging
-import yaml
 import os
-import json
+import pickle
+import stat
+import tempfile
+import time
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Set, FrozenSet, Iterable, NamedTuple, TYPE_CHECKING
 
-from src.connection.api import HomeAssistantAPI
+from src.automation._walkers import as_list, format_automation, referenced_entities
+
+if TYPE_CHECKING:
+    from src.connection.api import HomeAssistantAPI
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def _yaml() -> Tuple[Any, Any, Any]:
+    """
+    Import PyYAML on first use, so processes that only use the API never load it.
+    
+    Returns:
+        Tuple[Any, Any, Any]: The yaml module and the loader and dumper classes to use
+    """
+    import yaml
+    
+    try:
+        # Use the libyaml C parser and emitter when PyYAML was built with them
+        from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+    except ImportError:
+        from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+    
+    return yaml, YamlLoader, YamlDumper
+
+# Threads used to write automation files in directory mode
+_WRITE_WORKERS = 8
+
+# How long a cache validated against the YAML signature is trusted without another stat
+_REVALIDATE_INTERVAL_NS = 1_000_000_000
+
+# Longest time in seconds the API is skipped after repeated failures to list automations
+_API_BACKOFF_MAX = 300
+
+def _write_atomic(file_path: str, content: bytes) -> None:
+    """
+    Write serialized content to a file, replacing it if it exists.
+    
+    The content goes to a temporary file in the same directory which is then renamed
+    over the target, so a crash mid-write never leaves a truncated file behind.
+    
+    Args:
+        file_path (str): File to write
+        content (bytes): Serialized content
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(file_path).st_mode)
+    except OSError:
+        mode = 0o644
+    
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _write_file(item: Tuple[str, bytes]) -> None:
+    """
+    Write serialized content to a file, replacing it if it exists.
+    
+    Args:
+        item (Tuple[str, bytes]): File path and content
+    """
+    _write_atomic(*item)
+
+def _content_hash(content: bytes) -> bytes:
+    """
+    Hash serialized automation content to detect files that do not need rewriting.
+    
+    Args:
+        content (bytes): File content
+    
+    Returns:
+        bytes: 16-byte BLAKE2b digest
+    """
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+def _yaml_entries(path: Path) -> List[os.DirEntry]:
+    """
+    List the YAML files in a directory.
+    
+    Uses os.scandir so the file type comes from the directory entry instead of an extra stat.
+    
+    Args:
+        path (Path): Directory to list
+    
+    Returns:
+        List[os.DirEntry]: Directory entries of the *.yaml files
+    """
+    with os.scandir(path) as entries:
+        return [entry for entry in entries if entry.name.endswith('.yaml') and entry.is_file()]
+
+class Automation(NamedTuple):
+    """Loaded automation, with the fields lookups need pulled out of its configuration."""
+    id: Any
+    alias: str
+    enabled: bool
+    triggers: tuple
+    actions: tuple
+    entity_set: FrozenSet[str]
+    raw: Dict[str, Any]
+    
+    @classmethod
+    def from_config(cls, automation: Dict[str, Any]) -> 'Automation':
+        """
+        Build the record of an automation configuration.
+        
+        Args:
+            automation (Dict[str, Any]): Automation configuration
+        
+        Returns:
+            Automation: Record wrapping the configuration
+        """
+        # Normalize the trigger and action sections once, the configuration itself is left
+        # as written so saving it does not change its YAML
+        triggers = tuple(as_list(automation.get('trigger', [])))
+        actions = tuple(as_list(automation.get('action', [])))
+        
+        return cls(
+            id=automation.get('id'),
+            alias=automation.get('alias', 'Unnamed Automation'),
+            enabled=automation.get('enabled', True),
+            triggers=triggers,
+            actions=actions,
+            entity_set=frozenset(referenced_entities(automation, triggers, actions)),
+            raw=automation
+        )
+
 class AutomationManager:
     """Class for managing Home Assistant automations."""
     
-    def __init__(self, config: Dict[str, Any], api: HomeAssistantAPI = None):
+    def __init__(self, config: Dict[str, Any], api: 'HomeAssistantAPI' = None):
         """
         Initialize the automation manager.
         
@@ -29,15 +165,35 @@ class AutomationManager:
             api (HomeAssistantAPI, optional): Home Assistant API instance
         """
         self.config = config
-        self.api = api or HomeAssistantAPI(config)
+        
+        if not api:
+            from src.connection.api import HomeAssistantAPI
+            api = HomeAssistantAPI(config)
+        self.api = api
         
         # Configuration paths
         self.ha_config_dir = self.config['home_assistant'].get('config_dir', '')
         self.automations_path = self._get_automations_path()
+        self.invalidate_path()
         
-        # Cache for existing automations
+        # Cache for existing automations, valid while the YAML signature is unchanged
         self.automation_cache = {}
-        self.last_cache_refresh = None
+        self.cache_signature = None
+        self.cache_deadline_ns = 0
+        
+        # Automation ID to the normalized record of each cached automation
+        self.automation_records = {}
+        # File path to the (mtime, size, content hash) of each YAML file last read or written
+        self.file_hashes = {}
+        # Number of consecutive failed API listings
+        self.api_failures = 0
+        # Monotonic time before which the API listing is not retried
+        self.api_retry_at = 0.0
+        # Entity ID to the cached automations that reference it
+        self.entity_index = {}
+        
+        # Whether the cached automations came from the API rather than the YAML
+        self.api_source = False
     
     def _get_automations_path(self) -> str:
         """
@@ -65,6 +221,20 @@ class AutomationManager:
         # Default location
         return os.path.expanduser('~/automations.yaml')
     
+    def invalidate_path(self) -> None:
+        """
+        Resolve automations_path and whether it is a file or a directory.
+        
+        The result is cached so loads and saves do not stat the path again. A missing
+        path is treated as a file, which is created on the first save.
+        """
+        self.resolved_path = Path(self.automations_path)
+        try:
+            is_dir = stat.S_ISDIR(os.stat(self.resolved_path).st_mode)
+        except OSError:
+            is_dir = False
+        self.path_mode = 'dir' if is_dir else 'file'
+    
     async def load_automations(self, refresh: bool = False) -> Dict[str, Any]:
         """
         Load automations from the Home Assistant configuration.
@@ -75,38 +245,91 @@ class AutomationManager:
         Returns:
             Dict[str, Any]: Dictionary of automation ID/alias to automation data
         """
+        # Automations served by the API stay cached until an explicit refresh,
+        # so the YAML does not even need to be stat'ed
+        if self.api_source and self.automation_cache and not refresh:
+            return self.automation_cache
+        
+        # The path may have been created or replaced since it was last resolved
+        if refresh:
+            self.invalidate_path()
+        
+        # Skip the stat for callers that come back within the revalidation interval
+        now = time.monotonic_ns()
+        if self.automation_cache and not refresh and now < self.cache_deadline_ns:
+            return self.automation_cache
+        self.cache_deadline_ns = now + _REVALIDATE_INTERVAL_NS
+        
         # Check if we need to refresh the cache
-        if (not self.automation_cache or refresh or 
-            not self.last_cache_refresh or 
-            (datetime.now() - self.last_cache_refresh).total_seconds() > 300):
-            
+        signature = self._source_signature()
+        if not self.automation_cache or refresh or signature != self.cache_signature:
             automations = {}
             
-            # Try to get automations from API first
-            try:
-                api_automations = await self.api.get_automations()
-                if api_automations:
-                    # Process automations from API
-                    for automation in api_automations:
-                        if 'id' in automation:
-                            automations[automation['id']] = automation
-                        elif 'entity_id' in automation:
-                            # Extract ID from entity_id
-                            entity_id = automation['entity_id']
-                            if entity_id.startswith('automation.'):
-                                automations[entity_id[11:]] = automation
-            except Exception as e:
-                logger.warning(f"Failed to get automations from API: {e}")
+            # Try to get automations from API first, if this API client can list them
+            # unless it failed recently and is still backing off
+            get_automations = getattr(self.api, 'get_automations', None)
+            if get_automations is not None and time.monotonic() >= self.api_retry_at:
+                try:
+                    api_automations = await get_automations()
+                    self.api_failures = 0
+                    if api_automations:
+                        # Process automations from API
+                        for automation in api_automations:
+                            if 'id' in automation:
+                                automations[automation['id']] = automation
+                            elif 'entity_id' in automation:
+                                # Extract ID from entity_id
+                                entity_id = automation['entity_id']
+                                if entity_id.startswith('automation.'):
+                                    automations[entity_id[11:]] = automation
+                except Exception as e:
+                    # Back off exponentially so an unreachable API is not retried on every load
+                    self.api_failures += 1
+                    backoff = min(_API_BACKOFF_MAX, 2 ** self.api_failures)
+                    self.api_retry_at = time.monotonic() + backoff
+                    logger.warning(f"Failed to get automations from API, retrying in {backoff}s: {e}")
+            self.api_source = bool(automations)
             
             # If API didn't work or returned empty, try loading from file
             if not automations:
                 automations = self._load_automations_from_file()
             
-            self.automation_cache = automations
-            self.last_cache_refresh = datetime.now()
+            self._update_cache(automations, signature)
         
         return self.automation_cache
     
+    def _update_cache(self, automations: Dict[str, Any], signature: Optional[Tuple]) -> None:
+        """
+        Replace the cached automations and rebuild their records and the entity index.
+        
+        Args:
+            automations (Dict[str, Any]): Automations to cache
+            signature (Optional[Tuple]): Signature of the automations YAML from _source_signature
+        """
+        self.automation_cache = automations
+        self.cache_signature = signature
+        self.cache_deadline_ns = time.monotonic_ns() + _REVALIDATE_INTERVAL_NS
+        self.automation_records = {auto_id: Automation.from_config(auto) for auto_id, auto in automations.items()}
+        self.entity_index = self._build_entity_index(self.automation_records.values())
+    
+    def _build_entity_index(self, records: Iterable[Automation]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Index automations by the entities their triggers and actions reference.
+        
+        Args:
+            records (Iterable[Automation]): Records of the automations to index
+        
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Automations referencing each entity ID, in automation order
+        """
+        index = {}
+        
+        for record in records:
+            for entity_id in record.entity_set:
+                index.setdefault(entity_id, []).append(record.raw)
+        
+        return index
+    
     def _load_automations_from_file(self) -> Dict[str, Any]:
         """
         Load automations from the configuration file.
@@ -114,16 +337,30 @@ class AutomationManager:
         Returns:
             Dict[str, Any]: Dictionary of automation ID/alias to automation data
         """
+        yaml, YamlLoader, _ = _yaml()
         automations = {}
         
         try:
-            # Check if automations_path is a file or directory
-            path = Path(self.automations_path)
+            path = self.resolved_path
+            
+            # Nothing to load if the file or directory does not exist
+            signature = self._source_signature()
+            if signature is None:
+                return automations
             
-            if path.is_file():
+            # Reuse the parsed automations if the YAML has not changed since they were cached
+            cached = self._read_parse_cache(path, signature)
+            if cached is not None:
+                return cached
+            
+            # Only cache what was parsed if no file had to be skipped
+            complete = True
+            
+            # Check if automations_path is a file or directory
+            if self.path_mode == 'file':
                 # Load from a single file
-                with open(path, 'r') as f:
-                    content = yaml.safe_load(f)
+                with open(path, 'rb') as f:
+                    content = yaml.load(f, Loader=YamlLoader)
                     
                     # Handle different formats (list or dict)
                     if isinstance(content, list):
@@ -138,30 +375,199 @@ class AutomationManager:
                             if isinstance(auto, dict):
                                 automations[auto_id] = auto
             
-            elif path.is_dir():
+            else:
                 # Load from multiple files in a directory
-                for yaml_file in path.glob('*.yaml'):
+                loaded, complete = self._load_yaml_directory(path)
+                for yaml_file, content in loaded:
+                    stem = yaml_file.name[:-len('.yaml')]
                     try:
-                        with open(yaml_file, 'r') as f:
-                            content = yaml.safe_load(f)
-                            
-                            # Handle different formats
-                            if isinstance(content, list):
-                                for auto in content:
-                                    if isinstance(auto, dict):
-                                        key = auto.get('id', auto.get('alias', yaml_file.stem))
-                                        automations[key] = auto
-                            elif isinstance(content, dict):
-                                key = content.get('id', content.get('alias', yaml_file.stem))
-                                automations[key] = content
+                        # Handle different formats
+                        if isinstance(content, list):
+                            for auto in content:
+                                if isinstance(auto, dict):
+                                    key = auto.get('id', auto.get('alias', stem))
+                                    automations[key] = auto
+                        elif isinstance(content, dict):
+                            key = content.get('id', content.get('alias', stem))
+                            automations[key] = content
                     except Exception as e:
-                        logger.error(f"Failed to load automation file {yaml_file}: {e}")
+                        logger.error(f"Failed to load automation file {yaml_file.path}: {e}")
+                        complete = False
+            
+            if complete:
+                self._write_parse_cache(path, signature, automations)
         
         except Exception as e:
             logger.error(f"Failed to load automations from file: {e}")
         
         return automations
     
+    def _load_yaml_directory(self, path: Path) -> Tuple[List[Tuple[os.DirEntry, Any]], bool]:
+        """
+        Parse every YAML file in a directory.
+        
+        The files are parsed as one multi-document stream so a single libyaml parser is
+        used for the whole directory. If the stream cannot be split back into one document
+        per file, each file is parsed on its own instead.
+        
+        Args:
+            path (Path): Directory containing the automation YAML files
+        
+        Returns:
+            Tuple[List[Tuple[os.DirEntry, Any]], bool]: Each readable and parseable file with its
+                content, and whether every file in the directory could be read and parsed
+        """
+        yaml, YamlLoader, _ = _yaml()
+        sources = []
+        complete = True
+        for yaml_file in _yaml_entries(path):
+            try:
+                with open(yaml_file.path, 'rb') as f:
+                    sources.append((yaml_file, f.read()))
+            except Exception as e:
+                logger.error(f"Failed to load automation file {yaml_file.path}: {e}")
+                complete = False
+        
+        # Remember what is on disk so saves can skip files whose content does not change
+        self.file_hashes = {}
+        for yaml_file, content in sources:
+            file_stat = yaml_file.stat()
+            self.file_hashes[yaml_file.path] = (file_stat.st_mtime_ns, file_stat.st_size, _content_hash(content))
+        
+        documents = self._load_yaml_stream([content for _, content in sources])
+        if documents is not None:
+            return [(yaml_file, document) for (yaml_file, _), document in zip(sources, documents)], complete
+        
+        # Parse one file at a time so a broken file only loses its own automations
+        loaded = []
+        for yaml_file, content in sources:
+            try:
+                loaded.append((yaml_file, yaml.load(content, Loader=YamlLoader)))
+            except Exception as e:
+                logger.error(f"Failed to load automation file {yaml_file.path}: {e}")
+                complete = False
+        return loaded, complete
+    
+    def _load_yaml_stream(self, contents: List[bytes]) -> Optional[List[Any]]:
+        """
+        Parse several YAML files as a single multi-document stream.
+        
+        Args:
+            contents (List[bytes]): Raw content of each file
+        
+        Returns:
+            Optional[List[Any]]: One document per file, or None if the files cannot be
+                parsed together
+        """
+        yaml, YamlLoader, _ = _yaml()
+        # Files with their own document markers or directives cannot be split back apart
+        for content in contents:
+            if content.startswith((b'---', b'...', b'%')) or b'\n---' in content or b'\n...' in content:
+                return None
+        
+        # Start every file with an explicit document marker so empty files still yield a document
+        stream = b''.join(b'---\n' + content + b'\n' for content in contents)
+        try:
+            documents = list(yaml.load_all(stream, Loader=YamlLoader))
+        except Exception:
+            return None
+        
+        return documents if len(documents) == len(contents) else None
+    
+    def _source_signature(self) -> Optional[Tuple]:
+        """
+        Get a signature of the automation YAML that changes whenever the YAML changes.
+        
+        Returns:
+            Optional[Tuple]: Modification time and size of the file, or of every YAML file
+                in the directory, or None if the path does not exist
+        """
+        try:
+            if self.path_mode == 'dir':
+                return tuple(sorted(
+                    (yaml_file.name, file_stat.st_mtime_ns, file_stat.st_size)
+                    for yaml_file in _yaml_entries(self.resolved_path)
+                    for file_stat in (yaml_file.stat(),)
+                ))
+            
+            path_stat = os.stat(self.resolved_path)
+            return (path_stat.st_mtime_ns, path_stat.st_size)
+        except OSError:
+            return None
+    
+    def _parse_cache_path(self, path: Path) -> Path:
+        """
+        Get the path of the parse cache stored next to the automations file or directory.
+        
+        Args:
+            path (Path): Automations file or directory
+        
+        Returns:
+            Path: Path to the pickle cache
+        """
+        return path.with_name(path.name + '.pkl')
+    
+    def _read_parse_cache(self, path: Path, signature: Tuple) -> Optional[Dict[str, Any]]:
+        """
+        Read the parsed automations from the parse cache.
+        
+        Args:
+            path (Path): Automations file or directory
+            signature (Tuple): Current signature of the YAML from _source_signature
+        
+        Returns:
+            Optional[Dict[str, Any]]: Cached automations, or None if the cache is missing or stale
+        """
+        try:
+            with open(self._parse_cache_path(path), 'rb') as f:
+                cached = pickle.load(f)
+            
+            # Anything but the layout written by _write_parse_cache is a miss, so the YAML is parsed again
+            if not isinstance(cached, dict) or cached.get('signature') != signature:
+                return None
+            automations = cached.get('automations')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable automation parse cache: {e}")
+            return None
+        
+        return automations if isinstance(automations, dict) else None
+    
+    def _write_parse_cache(self, path: Path, signature: Tuple, automations: Dict[str, Any]) -> None:
+        """
+        Store the parsed automations in the parse cache.
+        
+        Args:
+            path (Path): Automations file or directory
+            signature (Tuple): Signature of the YAML the automations were parsed from
+            automations (Dict[str, Any]): Parsed automations
+        """
+        cache_path = self._parse_cache_path(path)
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'signature': signature, 'automations': automations}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic rename so concurrent readers never see a partial cache
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.debug(f"Failed to write automation parse cache: {e}")
+    
+    def _invalidate_parse_cache(self, path: Path) -> None:
+        """
+        Remove the parse cache of the automations file or directory.
+        
+        Args:
+            path (Path): Automations file or directory
+        """
+        try:
+            self._parse_cache_path(path).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.debug(f"Failed to remove automation parse cache: {e}")
+    
     async def save_automation(self, automation: Dict[str, Any]) -> bool:
         """
         Save an automation to the configuration.
@@ -188,8 +594,7 @@ class AutomationManager:
             
             # If saved successfully, update the cache
             if success:
-                self.automation_cache = automations
-                self.last_cache_refresh = datetime.now()
+                self._update_cache(automations, self._source_signature())
             
             return success
             
@@ -207,36 +612,68 @@ class AutomationManager:
         Returns:
             bool: Success status
         """
+        yaml, _, YamlDumper = _yaml()
         try:
             # Convert dictionary to list for YAML output
             automation_list = list(automations.values())
             
-            # Check if automations_path is a file or directory
-            path = Path(self.automations_path)
+            path = self.resolved_path
             
-            if path.is_file() or not path.exists():
+            # The YAML is about to change, drop its parse cache
+            self._invalidate_parse_cache(path)
+            
+            # Check if automations_path is a file or directory
+            if self.path_mode == 'file':
                 # Save to a single file
+                payload = yaml.dump(
+                    automation_list, Dumper=YamlDumper, encoding='utf-8', sort_keys=False, default_flow_style=False
+                )
                 os.makedirs(path.parent, exist_ok=True)
-                with open(path, 'w') as f:
-                    yaml.dump(automation_list, f, sort_keys=False, default_flow_style=False)
+                _write_atomic(str(path), payload)
             
-            elif path.is_dir():
+            else:
                 # Save each automation to a separate file
                 os.makedirs(path, exist_ok=True)
                 
-                # Clear existing files
-                for yaml_file in path.glob('*.yaml'):
-                    yaml_file.unlink()
-                
-                # Save each automation
+                # Serialize every automation up front so the pool below only does I/O,
+                # a later automation with the same filename replaces an earlier one
+                files = {}
                 for auto_id, auto in automations.items():
                     # Generate a filename from the ID or alias
                     filename = auto.get('id', auto.get('alias', f"auto_{len(automations)}"))
                     filename = filename.replace(' ', '_').lower()
                     
-                    file_path = path / f"{filename}.yaml"
-                    with open(file_path, 'w') as f:
-                        yaml.dump(auto, f, sort_keys=False, default_flow_style=False)
+                    file_path = os.path.join(path, f"{filename}.yaml")
+                    files[file_path] = yaml.dump(
+                        auto, Dumper=YamlDumper, encoding='utf-8', sort_keys=False, default_flow_style=False
+                    )
+                
+                # Clear existing files that are not rewritten below
+                entries = {yaml_file.path: yaml_file for yaml_file in _yaml_entries(path)}
+                stale = [file_path for file_path in entries if file_path not in files]
+                
+                # Only write the files that are new or whose content changed. A file counts
+                # as unchanged if it still has the size and mtime it had when it was hashed.
+                hashes = {file_path: _content_hash(content) for file_path, content in files.items()}
+                changed = {}
+                for file_path, content in files.items():
+                    entry = entries.get(file_path)
+                    if entry is not None:
+                        file_stat = entry.stat()
+                        known = (file_stat.st_mtime_ns, file_stat.st_size, hashes[file_path])
+                        if self.file_hashes.get(file_path) == known:
+                            continue
+                    changed[file_path] = content
+                
+                with ThreadPoolExecutor(max_workers=_WRITE_WORKERS) as pool:
+                    list(pool.map(os.unlink, stale))
+                    list(pool.map(_write_file, changed.items()))
+                
+                for file_path in stale:
+                    self.file_hashes.pop(file_path, None)
+                for file_path in changed:
+                    file_stat = os.stat(file_path)
+                    self.file_hashes[file_path] = (file_stat.st_mtime_ns, file_stat.st_size, hashes[file_path])
             
             return True
             
@@ -271,8 +708,7 @@ class AutomationManager:
             
             # If saved successfully, update the cache
             if success:
-                self.automation_cache = automations
-                self.last_cache_refresh = datetime.now()
+                self._update_cache(automations, self._source_signature())
             
             return success
             
@@ -312,13 +748,13 @@ class AutomationManager:
                     # Only add 'enabled: false' if disabling, otherwise let HA manage it
                     automations[automation_id]['enabled'] = False
                 
-                # Save to file
-                success = self._save_automations_to_file(automations)
+                # Patch the one line in place, or save the whole file if that is not possible
+                success = (self._patch_enabled_in_file(automations[automation_id])
+                           or self._save_automations_to_file(automations))
                 
                 # If saved successfully, update the cache
                 if success:
-                    self.automation_cache = automations
-                    self.last_cache_refresh = datetime.now()
+                    self._update_cache(automations, self._source_signature())
                 
                 return success
             else:
@@ -329,6 +765,74 @@ class AutomationManager:
             logger.error(f"Failed to enable/disable automation: {e}")
             return False
     
+    def _patch_enabled_in_file(self, automation: Dict[str, Any]) -> bool:
+        """
+        Update the enabled key of one automation in the automations file without re-emitting it.
+        
+        Only the layout written by yaml.dump is recognized: a top-level list whose items start
+        with "- " in the first column and have their keys indented by two spaces. The patched
+        item is parsed back and compared with the automation, and anything unexpected (directory
+        mode, a hand-written layout, flow style, anchors) is left to the full rewrite. Unlike the
+        full rewrite, the patch keeps the comments and formatting of the rest of the file.
+        
+        Args:
+            automation (Dict[str, Any]): Automation with its enabled key already updated
+        
+        Returns:
+            bool: True if the file was patched, False if it has to be rewritten instead
+        """
+        if self.path_mode != 'file' or 'enabled' not in automation:
+            return False
+        
+        yaml, YamlLoader, _ = _yaml()
+        path = self.resolved_path
+        try:
+            with open(path, 'rb') as f:
+                lines = f.read().decode('utf-8').splitlines(keepends=True)
+            
+            # Split the file into the line ranges of its list items
+            starts = [i for i, line in enumerate(lines) if line.startswith('- ')]
+            blocks = list(zip(starts, starts[1:] + [len(lines)]))
+            
+            # Only parse the items whose text mentions the ID
+            needle = str(automation.get('id'))
+            matches = []
+            for start, end in blocks:
+                text = ''.join(lines[start:end])
+                if needle not in text:
+                    continue
+                item = yaml.load(text, Loader=YamlLoader)
+                if isinstance(item, list) and len(item) == 1 and isinstance(item[0], dict) \
+                        and item[0].get('id') == automation.get('id'):
+                    matches.append((start, end))
+            if len(matches) != 1:
+                return False
+            start, end = matches[0]
+            
+            enabled_line = f"  enabled: {'true' if automation['enabled'] else 'false'}\n"
+            keys = [i for i in range(start + 1, end) if lines[i].startswith('  enabled:')]
+            if keys:
+                lines[keys[0]] = enabled_line
+            else:
+                # A new key goes after the last key, as the full rewrite would put it
+                last = max(i for i in range(start, end) if lines[i].strip())
+                if not lines[last].endswith('\n'):
+                    lines[last] += '\n'
+                lines.insert(last + 1, enabled_line)
+                end += 1
+            
+            # Make sure the patch produced exactly the updated automation
+            if yaml.load(''.join(lines[start:end]), Loader=YamlLoader) != [automation]:
+                return False
+            
+            self._invalidate_parse_cache(path)
+            _write_atomic(str(path), ''.join(lines).encode('utf-8'))
+            return True
+        
+        except Exception as e:
+            logger.debug(f"Falling back to a full rewrite of the automations file: {e}")
+            return False
+    
     async def trigger_automation(self, automation_id: str) -> bool:
         """
         Trigger an automation manually.
@@ -360,63 +864,12 @@ class AutomationManager:
         Returns:
             Dict[str, Any]: Formatted automation
         """
-        # Create a simplified view of the automation
-        formatted = {
-            'id': automation.get('id', ''),
-            'alias': automation.get('alias', 'Unnamed Automation'),
-            'description': automation.get('description', ''),
-            'enabled': automation.get('enabled', True)
-        }
-        
-        # Add trigger information
-        trigger = automation.get('trigger', [])
-        if not isinstance(trigger, list):
-            trigger = [trigger]
-        
-        formatted['triggers'] = []
-        for t in trigger:
-            if isinstance(t, dict):
-                trigger_info = {'type': t.get('platform', 'unknown')}
-                
-                # Add details based on trigger type
-                if t.get('platform') == 'state':
-                    trigger_info['entity'] = t.get('entity_id', '')
-                    trigger_info['to'] = t.get('to', '')
-                    trigger_info['from'] = t.get('from', '')
-                elif t.get('platform') == 'time':
-                    trigger_info['at'] = t.get('at', '')
-                
-                formatted['triggers'].append(trigger_info)
-        
-        # Add action information
-        action = automation.get('action', [])
-        if not isinstance(action, list):
-            action = [action]
-        
-        formatted['actions'] = []
-        for a in action:
-            if isinstance(a, dict):
-                action_info = {'type': 'service' if 'service' in a else 'unknown'}
-                
-                # Add details based on action type
-                if 'service' in a:
-                    action_info['service'] = a.get('service', '')
-                    
-                    # Get entity IDs
-                    if 'entity_id' in a:
-                        action_info['entities'] = [a['entity_id']]
-                    elif 'target' in a and 'entity_id' in a['target']:
-                        entity_id = a['target']['entity_id']
-                        if isinstance(entity_id, list):
-                            action_info['entities'] = entity_id
-                        else:
-                            action_info['entities'] = [entity_id]
-                    else:
-                        action_info['entities'] = []
-                
-                formatted['actions'].append(action_info)
+        # Reuse the normalized triggers and actions of a cached automation
+        record = self.automation_records.get(automation.get('id'))
+        if record is not None and record.raw is automation:
+            return format_automation(automation, record.triggers, record.actions)
         
-        return formatted
+        return format_automation(automation)
     
     async def get_automation_by_entity(self, entity_id: str) -> List[Dict[str, Any]]:
         """
@@ -428,47 +881,21 @@ class AutomationManager:
         Returns:
             List[Dict[str, Any]]: List of automations that reference the entity
         """
-        automations = await self.load_automations()
-        matching_automations = []
-        
-        # Convert automation dictionary to a list for processing
-        auto_list = list(automations.values())
-        
-        for auto in auto_list:
-            # Check triggers
-            trigger = auto.get('trigger', [])
-            if not isinstance(trigger, list):
-                trigger = [trigger]
-            
-            for t in trigger:
-                if isinstance(t, dict) and t.get('entity_id') == entity_id:
-                    matching_automations.append(auto)
-                    break
-            
-            # Check actions
-            if auto not in matching_automations:  # Skip if already added
-                action = auto.get('action', [])
-                if not isinstance(action, list):
-                    action = [action]
-                
-                for a in action:
-                    if isinstance(a, dict):
-                        # Check direct entity_id
-                        if a.get('entity_id') == entity_id:
-                            matching_automations.append(auto)
-                            break
-                        
-                        # Check target.entity_id
-                        if 'target' in a and 'entity_id' in a['target']:
-                            target_entities = a['target']['entity_id']
-                            if isinstance(target_entities, list) and entity_id in target_entities:
-                                matching_automations.append(auto)
-                                break
-                            elif target_entities == entity_id:
-                                matching_automations.append(auto)
-                                break
-        
-        return matching_automations
+        await self.load_automations()
+        return list(self.entity_index.get(entity_id, []))
+    
+    async def bulk_get_automations_by_entities(self, entity_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Find the automations that reference each of several entities.
+        
+        Args:
+            entity_ids (List[str]): Entity IDs to search for
+        
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: List of automations that reference each entity
+        """
+        await self.load_automations()
+        return {entity_id: list(self.entity_index.get(entity_id, [])) for entity_id in entity_ids}
     
     async def get_raw_automation_yaml(self, automation_id: str) -> Optional[str]:
         """
@@ -485,7 +912,8 @@ class AutomationManager:
         if automation_id in automations:
             try:
                 auto = automations[automation_id]
-                return yaml.dump(auto, sort_keys=False, default_flow_style=False)
+                yaml, _, YamlDumper = _yaml()
+                return yaml.dump(auto, Dumper=YamlDumper, sort_keys=False, default_flow_style=False)
             except Exception as e:
                 logger.error(f"Failed to generate YAML for automation {automation_id}: {e}")
                 return None
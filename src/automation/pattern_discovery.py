@@ -4,14 +4,325 @@ Home Assistant Advanced Pattern Discovery.
 This module provides advanced algorithms for discovering usage patterns in Home Assistant.
 """
 
+import functools
+import hashlib
 import logging
+import sys
+import threading
 import numpy as np
-from datetime import datetime, timedelta, time
-from typing import Dict, List, Any, Optional, Tuple, Set
-from collections import defaultdict
+from typing import Dict, List, Any, Callable, Optional, Tuple, FrozenSet, NamedTuple
+from collections import Counter, OrderedDict
+from itertools import chain, compress
+
+from src.automation.utils import parse_timestamps_us
 
 logger = logging.getLogger(__name__)
 
+# Prepared entry timestamps are integer microseconds since the epoch
+_SECOND = 1_000_000
+
+# Domains whose entities cannot be controlled by an automation
+_NON_CONTROLLABLE = frozenset({'binary_sensor', 'sensor', 'sun', 'weather'})
+
+# Domains whose states are good candidates for automation conditions
+_CONDITION_DOMAINS = frozenset({'binary_sensor', 'sensor', 'sun', 'weather', 'person', 'device_tracker'})
+
+# Sequence counting kernel, resolved on first use so importing this module stays cheap
+_sequence_kernel = None
+
+def _get_sequence_kernel():
+    """
+    Get the Numba sequence counting kernel, importing it on first use.
+    
+    Returns:
+        Callable: _kernels.count_sequence, or _count_sequence_python if Numba is not installed
+    """
+    global _sequence_kernel
+    if _sequence_kernel is None:
+        try:
+            from src.automation._kernels import count_sequence
+            _sequence_kernel = count_sequence
+        except ImportError:
+            logger.info("Numba is not installed, using pure Python sequence counting")
+            _sequence_kernel = _count_sequence_python
+    return _sequence_kernel
+
+def _count_sequence_python(timestamps: np.ndarray, order: np.ndarray, key_offsets: np.ndarray,
+                           steps: np.ndarray, window: int) -> int:
+    """
+    NumPy version of _kernels.count_sequence, used when JIT compilation is off.
+    
+    Args:
+        timestamps (np.ndarray): Timestamps of the timeline entries, in ascending order
+        order (np.ndarray): Timeline positions grouped by key
+        key_offsets (np.ndarray): Start of each key's positions in order, plus the total length
+        steps (np.ndarray): Key of each step of the sequence
+        window (int): Maximum delay after the start, in the unit of the timestamps
+    
+    Returns:
+        int: Same as _kernels.count_sequence
+    """
+    # Every entry matching the first step is a potential start of the sequence
+    starts = order[key_offsets[steps[0]]:key_offsets[steps[0] + 1]]
+    deadlines = timestamps[starts] + window
+    matched = np.ones(len(starts), dtype=bool)
+    
+    # The first entry of a step after a start is the earliest one, so the step is
+    # matched if that entry falls within the window
+    for step in steps[1:]:
+        positions = order[key_offsets[step]:key_offsets[step + 1]]
+        following = np.searchsorted(positions, starts, side='right')
+        found = following < len(positions)
+        matched &= found
+        matched[found] &= timestamps[positions[following[found]]] <= deadlines[found]
+    
+    return int(np.count_nonzero(matched))
+
+# Day of week and hour buckets of the daily search
+_WEEK_HOURS = 7 * 24
+
+# Most distinct states of an entity for counting them per bucket in a dense matrix
+_DENSE_STATES = 4096
+
+# Number of results each discover_* method keeps for repeated calls on unchanged history
+_CACHE_SIZE = 4
+
+def _history_fingerprint(entity_history: Dict[str, List[Dict[str, Any]]]) -> bytes:
+    """
+    Get a content hash of entity history to detect repeated calls.
+    
+    Every entry's last_changed and state are hashed, so editing, inserting or removing any
+    entry changes the fingerprint, not just appending to a history.
+    
+    Args:
+        entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
+    
+    Returns:
+        bytes: BLAKE2b digest of the entity IDs and the entries of their history
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for entity_id, history in entity_history.items():
+        try:
+            # Join the columns when every entry has string values, which is much faster than repr
+            columns = '\x1f'.join([entry['last_changed'] for entry in history]) + '\x1e' \
+                + '\x1f'.join([entry['state'] for entry in history])
+        except (KeyError, TypeError):
+            # Entries the timeline drops still count towards the history length the searches use
+            columns = repr([
+                (entry['last_changed'], entry['state']) if 'last_changed' in entry and 'state' in entry else None
+                for entry in history
+            ])
+        digest.update(f"{entity_id}\x1e{len(history)}\x1e{columns}\x1d".encode('utf-8', 'surrogatepass'))
+    return digest.digest()
+
+def _cached_by_history(method: Callable) -> Callable:
+    """
+    Keep the last _CACHE_SIZE results of a discover_* method by history fingerprint.
+    
+    Args:
+        method (Callable): Method taking the entity history and returning a list of patterns
+    
+    Returns:
+        Callable: Method returning a copy of the cached list when the history is unchanged
+    """
+    @functools.wraps(method)
+    def wrapper(self, entity_history):
+        fingerprint = _history_fingerprint(entity_history)
+        
+        # The methods may run concurrently in threads, so the cache is only touched under the lock
+        with self._cache_lock:
+            cache = self._result_cache.setdefault(method.__name__, OrderedDict())
+            patterns = cache.get(fingerprint)
+            if patterns is not None:
+                cache.move_to_end(fingerprint)
+        
+        if patterns is None:
+            patterns = method(self, entity_history)
+            with self._cache_lock:
+                cache[fingerprint] = patterns
+                if len(cache) > _CACHE_SIZE:
+                    cache.popitem(last=False)
+        
+        return list(patterns)
+    
+    return wrapper
+
+# joblib module, resolved on first use since parallel discovery is optional
+_joblib = None
+
+def _get_joblib():
+    """
+    Get the joblib module, importing it on first use.
+    
+    Returns:
+        module: joblib, or None if it is not installed
+    """
+    global _joblib
+    if _joblib is None:
+        try:
+            import joblib
+            _joblib = joblib
+        except ImportError:
+            logger.info("joblib is not installed, discovering patterns in a single process")
+            _joblib = False
+    return _joblib or None
+
+class DailyPattern(NamedTuple):
+    """Entity that takes the same state at the same day of week and hour."""
+    
+    entity_id: str
+    domain: str
+    day_of_week: int
+    hour: int
+    state: Any
+    confidence: float
+    occurrences: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the pattern to the dictionary format used by the suggestion engine.
+        
+        Returns:
+            Dict[str, Any]: Pattern with its type and fields
+        """
+        return {
+            'type': 'daily',
+            'entity_id': self.entity_id,
+            'domain': self.domain,
+            'day_of_week': self.day_of_week,
+            'hour': self.hour,
+            'state': self.state,
+            'confidence': self.confidence,
+            'occurrences': self.occurrences
+        }
+
+class SequencePattern(NamedTuple):
+    """Entities that repeatedly change state in the same order within a short time."""
+    
+    steps: Tuple[Tuple[str, Any, str], ...]
+    confidence: float
+    occurrences: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the pattern to the dictionary format used by the suggestion engine.
+        
+        Returns:
+            Dict[str, Any]: Pattern with its type, steps as dictionaries and sequence key
+        """
+        return {
+            'type': 'sequence',
+            'steps': [
+                {
+                    'entity_id': entity_id,
+                    'state': state,
+                    'domain': domain
+                } for entity_id, state, domain in self.steps
+            ],
+            'sequence_key': tuple((entity_id, state) for entity_id, state, _ in self.steps),
+            'confidence': self.confidence,
+            'occurrences': self.occurrences
+        }
+
+class ConditionalPattern(NamedTuple):
+    """Entity state that follows a state change of a condition entity."""
+    
+    entity_id: str
+    domain: str
+    condition_entity: str
+    condition_state: Any
+    target_state: Any
+    confidence: float
+    occurrences: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the pattern to the dictionary format used by the suggestion engine.
+        
+        Returns:
+            Dict[str, Any]: Pattern with its type and fields
+        """
+        return {
+            'type': 'conditional',
+            'entity_id': self.entity_id,
+            'domain': self.domain,
+            'condition_entity': self.condition_entity,
+            'condition_state': self.condition_state,
+            'target_state': self.target_state,
+            'confidence': self.confidence,
+            'occurrences': self.occurrences
+        }
+
+class PeriodicPattern(NamedTuple):
+    """Entity that takes a state at a regular interval."""
+    
+    entity_id: str
+    domain: str
+    state: Any
+    interval_hours: float
+    confidence: float
+    occurrences: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the pattern to the dictionary format used by the suggestion engine.
+        
+        Returns:
+            Dict[str, Any]: Pattern with its type and fields
+        """
+        return {
+            'type': 'periodic',
+            'entity_id': self.entity_id,
+            'domain': self.domain,
+            'state': self.state,
+            'interval_hours': self.interval_hours,
+            'confidence': self.confidence,
+            'occurrences': self.occurrences
+        }
+
+class _Timeline(NamedTuple):
+    """
+    History of all entities as parallel arrays, with entity IDs and states interned to integer IDs.
+    
+    The entries of the entity with ID k are entries[offsets[k]:offsets[k + 1]], in history order.
+    """
+    
+    entity_ids: List[str]
+    domains: List[str]
+    states: List[Any]
+    entity_ids_map: Dict[str, int]
+    domain_ids_map: Dict[str, int]
+    domain_ids: np.ndarray
+    offsets: np.ndarray
+    eid_arr: np.ndarray
+    state_arr: np.ndarray
+    ts_arr: np.ndarray
+    wall_arr: np.ndarray
+    
+    def entity_slice(self, eid: int) -> slice:
+        """
+        Get the range of an entity's entries in the arrays.
+        
+        Args:
+            eid (int): Interned entity ID
+        
+        Returns:
+            slice: Range of the entity's entries
+        """
+        return slice(self.offsets[eid], self.offsets[eid + 1])
+    
+    def in_domains(self, domains: FrozenSet[str]) -> np.ndarray:
+        """
+        Check which entities belong to a set of domains.
+        
+        Args:
+            domains (FrozenSet[str]): Domains to look for
+        
+        Returns:
+            np.ndarray: Boolean mask by interned entity ID
+        """
+        return np.isin(self.domain_ids, [self.domain_ids_map[d] for d in domains if d in self.domain_ids_map])
+
 class PatternDiscovery:
     """Class for discovering patterns in Home Assistant usage data."""
     
@@ -25,372 +336,650 @@ class PatternDiscovery:
         self.config = config
         self.min_occurrences = config['automation'].get('min_occurrences', 3)
         self.confidence_threshold = config['automation'].get('confidence_threshold', 0.7)
+        self.use_jit = config['automation'].get('jit', True)
+        self.n_jobs = config['automation'].get('n_jobs', 1)
+        
+        # Results by method and history fingerprint, and the last timeline built
+        self._result_cache = {}
+        self._timeline_fingerprint = None
+        self._timeline = None
+        self._cache_lock = threading.Lock()
+        self._timeline_lock = threading.Lock()
     
-    def discover_daily_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Get the state to pickle, without the caches, for joblib worker processes.
+        
+        Returns:
+            Dict[str, Any]: Instance attributes with empty caches
+        """
+        state = self.__dict__.copy()
+        state.update(_result_cache={}, _timeline_fingerprint=None, _timeline=None)
+        del state['_cache_lock'], state['_timeline_lock']
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        """
+        Restore a pickled instance, with new locks for its caches.
+        
+        Args:
+            state (Dict[str, Any]): Instance attributes, as returned by __getstate__
+        """
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+        self._timeline_lock = threading.Lock()
+    
+    @_cached_by_history
+    def discover_daily_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[DailyPattern]:
         """
         Discover daily patterns in entity usage.
         
         Args:
             entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
-            
+        
         Returns:
-            List[Dict[str, Any]]: Daily patterns detected
+            List[DailyPattern]: Daily patterns detected
         """
-        daily_patterns = []
+        timeline = self._build_timeline(entity_history)
+        tasks = []
         
-        for entity_id, history in entity_history.items():
+        for eid, history in enumerate(entity_history.values()):
             # Skip entities with limited history
             if len(history) < self.min_occurrences:
                 continue
             
-            # Analyze entity domain
-            domain = entity_id.split('.')[0]
-            
-            # Group state changes by day of week and hour
-            day_hour_buckets = self._group_by_day_and_hour(history)
-            
-            # Analyze each day/hour bucket for consistent patterns
-            for (day, hour), states in day_hour_buckets.items():
-                if len(states) < self.min_occurrences:
-                    continue
-                
-                # Check for consistent states
-                counter = defaultdict(int)
-                for state in states:
-                    counter[state] += 1
-                
-                # Find most common state and calculate confidence
-                if counter:
-                    most_common_state = max(counter.items(), key=lambda x: x[1])
-                    state_value, count = most_common_state
-                    confidence = count / len(states)
-                    
-                    if confidence >= self.confidence_threshold:
-                        pattern = {
-                            'type': 'daily',
-                            'entity_id': entity_id,
-                            'domain': domain,
-                            'day_of_week': day,
-                            'hour': hour,
-                            'state': state_value,
-                            'confidence': confidence,
-                            'occurrences': count
-                        }
-                        daily_patterns.append(pattern)
+            entries = timeline.entity_slice(eid)
+            tasks.append((
+                timeline.entity_ids[eid], timeline.domains[eid],
+                timeline.wall_arr[entries], timeline.state_arr[entries], timeline.states
+            ))
         
-        return daily_patterns
+        return list(chain.from_iterable(self._map_entities(self._discover_daily_for_entity, tasks)))
     
-    def discover_sequence_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    @_cached_by_history
+    def discover_sequence_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[SequencePattern]:
         """
         Discover sequence patterns where multiple entities change in a specific order.
         
         Args:
             entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
-            
+        
         Returns:
-            List[Dict[str, Any]]: Sequence patterns detected
+            List[SequencePattern]: Sequence patterns detected
         """
-        # Flatten history entries and sort by timestamp
-        all_entries = []
-        for entity_id, history in entity_history.items():
-            for entry in history:
-                if 'last_changed' in entry and 'state' in entry:
-                    all_entries.append({
-                        'entity_id': entity_id,
-                        'timestamp': entry['last_changed'],
-                        'state': entry['state'],
-                        'domain': entity_id.split('.')[0]
-                    })
-        
-        # Sort entries by timestamp
-        all_entries.sort(key=lambda x: x['timestamp'])
+        # Sort the entries of all entities by timestamp
+        timeline = self._build_timeline(entity_history)
+        by_time = np.argsort(timeline.ts_arr, kind='stable')
+        timestamps = timeline.ts_arr[by_time]
+        entry_eids = timeline.eid_arr[by_time]
         
         # Look for sequences of state changes within a time window
         sequence_patterns = []
-        window_size = timedelta(minutes=2)  # Look for sequences within 2 minutes
+        count_cache = {}
+        window_size = 120 * _SECOND  # Look for sequences within 2 minutes
+        
+        # Find where the window starting at each entry ends, for all entries at once
+        window_ends = np.searchsorted(timestamps, timestamps + window_size, side='right').tolist()
+        
+        # Give every (entity, state) pair a key and index the timeline positions of each key once
+        # for counting occurrences: the positions of key k are order[key_offsets[k]:key_offsets[k + 1]]
+        n_states = len(timeline.states)
+        key_codes, entry_keys = np.unique(
+            entry_eids.astype(np.int64) * n_states + timeline.state_arr[by_time], return_inverse=True
+        )
+        entry_keys = entry_keys.astype(np.int64)
+        order = np.argsort(entry_keys, kind='stable')
+        key_offsets = np.concatenate(([0], np.cumsum(np.bincount(entry_keys, minlength=len(key_codes)))))
+        key_eids = (key_codes // n_states).tolist()
+        key_states = (key_codes % n_states).tolist()
+        
+        entry_eids = entry_eids.tolist()
+        entry_keys = entry_keys.tolist()
         
         # Sliding window through the timeline
-        for i in range(len(all_entries)):
-            start_entry = all_entries[i]
-            start_time = datetime.fromisoformat(start_entry['timestamp'].replace('Z', '+00:00'))
+        for i, end in enumerate(window_ends):
+            # Fewer than 3 entries in the window cannot form a sequence
+            if end - i < 3:
+                continue
             
-            # Collect state changes within the window
-            sequence = [start_entry]
-            for j in range(i + 1, len(all_entries)):
-                entry = all_entries[j]
-                entry_time = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
-                
-                if (entry_time - start_time) <= window_size:
-                    # Only add if it's a different entity
-                    if entry['entity_id'] != start_entry['entity_id']:
-                        sequence.append(entry)
-                else:
-                    # Outside the window, stop
-                    break
+            # Collect state changes of other entities within the window
+            start_eid = entry_eids[i]
+            seq_key = [entry_keys[i]]
+            seq_key.extend(entry_keys[j] for j in range(i + 1, end) if entry_eids[j] != start_eid)
             
             # Only consider sequences with at least 3 entities
-            if len(sequence) >= 3:
-                # Create a sequence key
-                seq_key = tuple((e['entity_id'], e['state']) for e in sequence)
+            if len(seq_key) >= 3:
+                seq_key = tuple(seq_key)
                 
-                # Check if we've found this exact sequence before
-                if seq_key not in [s.get('sequence_key') for s in sequence_patterns]:
+                # Check if we've counted this exact sequence before. The count only depends on
+                # the key, so a repeated key is either emitted already or too rare again.
+                if seq_key not in count_cache:
                     # Count occurrences of similar sequences
-                    occurrences = self._count_sequence_occurrences(all_entries, sequence)
+                    steps = np.array(seq_key, dtype=np.int64)
+                    occurrences = self._count_sequence_occurrences(timestamps, order, key_offsets, steps)
+                    count_cache[seq_key] = occurrences
                     
                     if occurrences >= self.min_occurrences:
-                        pattern = {
-                            'type': 'sequence',
-                            'steps': [
-                                {
-                                    'entity_id': e['entity_id'],
-                                    'state': e['state'],
-                                    'domain': e['domain']
-                                } for e in sequence
-                            ],
-                            'sequence_key': seq_key,
-                            'confidence': min(1.0, occurrences / 10),  # Scale confidence
-                            'occurrences': occurrences
-                        }
+                        pattern = SequencePattern(
+                            steps=tuple(
+                                (timeline.entity_ids[key_eids[key]], timeline.states[key_states[key]],
+                                 timeline.domains[key_eids[key]])
+                                for key in seq_key
+                            ),
+                            confidence=min(1.0, occurrences / 10),  # Scale confidence
+                            occurrences=occurrences
+                        )
                         sequence_patterns.append(pattern)
         
         return sequence_patterns
     
-    def discover_conditional_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    @_cached_by_history
+    def discover_conditional_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[ConditionalPattern]:
         """
         Discover conditional patterns where entity states depend on other entity states.
         
         Args:
             entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
+        
+        Returns:
+            List[ConditionalPattern]: Conditional patterns detected
+        """
+        # Parse every history once, not once per entity pair
+        timeline = self._build_timeline(entity_history)
+        
+        # Partition the entities with enough history into controllable targets and condition
+        # candidates once, so only target x condition pairs are visited
+        enough_history = np.array(
+            [len(history) >= self.min_occurrences for history in entity_history.values()], dtype=bool
+        )
+        target_eids = np.flatnonzero(enough_history & ~timeline.in_domains(_NON_CONTROLLABLE)).tolist()
+        condition_eids = np.flatnonzero(enough_history & timeline.in_domains(_CONDITION_DOMAINS)).tolist()
+        
+        conditions = []
+        for condition_eid in condition_eids:
+            condition_ts = timeline.ts_arr[timeline.entity_slice(condition_eid)]
+            if not len(condition_ts):
+                continue
+            conditions.append((
+                condition_eid, timeline.entity_ids[condition_eid], condition_ts,
+                timeline.state_arr[timeline.entity_slice(condition_eid)],
+                int(condition_ts.min()), int(condition_ts.max())
+            ))
+        tasks = [
+            (
+                eid, timeline.entity_ids[eid], timeline.domains[eid],
+                timeline.ts_arr[timeline.entity_slice(eid)], timeline.state_arr[timeline.entity_slice(eid)],
+                conditions, timeline.states
+            )
+            for eid in target_eids
+        ]
+        
+        return list(chain.from_iterable(self._map_entities(self._discover_conditional_for_entity, tasks)))
+    
+    @_cached_by_history
+    def discover_periodic_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[PeriodicPattern]:
+        """
+        Discover periodic patterns where entities change at regular intervals.
+        
+        Args:
+            entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
+        
+        Returns:
+            List[PeriodicPattern]: Periodic patterns detected
+        """
+        timeline = self._build_timeline(entity_history)
+        controllable = (~timeline.in_domains(_NON_CONTROLLABLE)).tolist()
+        tasks = []
+        
+        for eid, history in enumerate(entity_history.values()):
+            # Skip entities that can't be controlled or don't have enough history
+            if not controllable[eid] or len(history) < self.min_occurrences * 2:
+                continue
             
+            entries = timeline.entity_slice(eid)
+            tasks.append((
+                timeline.entity_ids[eid], timeline.domains[eid],
+                timeline.ts_arr[entries], timeline.state_arr[entries], timeline.states
+            ))
+        
+        return list(chain.from_iterable(self._map_entities(self._discover_periodic_for_entity, tasks)))
+    
+    def _map_entities(self, func: Callable[..., List[Any]], tasks: List[Tuple]) -> List[List[Any]]:
+        """
+        Run a per-entity search over a list of tasks.
+        
+        The tasks are spread over n_jobs worker processes with joblib when n_jobs is not 1
+        and joblib is installed, and run in this process otherwise.
+        
+        Args:
+            func (Callable[..., List[Any]]): Per-entity search, called with the items of a task
+            tasks (List[Tuple]): Arguments of each call
+        
+        Returns:
+            List[List[Any]]: Results of the calls, in the order of the tasks
+        """
+        joblib = _get_joblib() if self.n_jobs != 1 and len(tasks) > 1 else None
+        if joblib is None:
+            return [func(*task) for task in tasks]
+        
+        return joblib.Parallel(n_jobs=self.n_jobs, prefer='processes', batch_size='auto')(
+            joblib.delayed(func)(*task) for task in tasks
+        )
+    
+    def _discover_daily_for_entity(self, entity_id: str, domain: str, wall: np.ndarray, state_ids: np.ndarray,
+                                   states: List[Any]) -> List[DailyPattern]:
+        """
+        Discover the daily patterns of one entity.
+        
+        Args:
+            entity_id (str): Entity ID
+            domain (str): Domain of the entity
+            wall (np.ndarray): Wall-clock times of the entity's entries
+            state_ids (np.ndarray): Interned state IDs of the entries
+            states (List[Any]): States by interned ID
+        
         Returns:
-            List[Dict[str, Any]]: Conditional patterns detected
+            List[DailyPattern]: Daily patterns of the entity
+        """
+        daily_patterns = []
+        
+        # Find the most common state of each day of week and hour
+        day_hour_states = self._dominant_state_by_day_and_hour(wall, state_ids, len(states))
+        
+        # Analyze each day/hour bucket for consistent patterns
+        for bucket, (state_id, count, total) in day_hour_states.items():
+            if total < self.min_occurrences:
+                continue
+            
+            # Calculate confidence of the most common state
+            confidence = count / total
+            
+            if confidence >= self.confidence_threshold:
+                pattern = DailyPattern(
+                    entity_id=entity_id,
+                    domain=domain,
+                    day_of_week=bucket // 24,
+                    hour=bucket % 24,
+                    state=states[state_id],
+                    confidence=confidence,
+                    occurrences=count
+                )
+                daily_patterns.append(pattern)
+        
+        return daily_patterns
+    
+    def _discover_conditional_for_entity(self, eid: int, entity_id: str, domain: str, entity_ts: np.ndarray,
+                                         entity_states: np.ndarray,
+                                         conditions: List[Tuple[int, str, np.ndarray, np.ndarray, int, int]],
+                                         states: List[Any]) -> List[ConditionalPattern]:
+        """
+        Discover the conditional patterns of one target entity.
+        
+        Args:
+            eid (int): Interned entity ID
+            entity_id (str): Entity ID
+            domain (str): Domain of the entity
+            entity_ts (np.ndarray): Timestamps of the entity's entries, in history order
+            entity_states (np.ndarray): Interned state IDs of the entries
+            conditions (List[Tuple[int, str, np.ndarray, np.ndarray, int, int]]): Interned ID, entity ID,
+                timestamps, state IDs and first and last timestamp of each condition entity
+            states (List[Any]): States by interned ID
+        
+        Returns:
+            List[ConditionalPattern]: Conditional patterns of the entity
         """
         conditional_patterns = []
+        if not len(entity_ts):
+            return conditional_patterns
         
-        # First, identify potential "condition" entities
-        condition_entities = set()
-        for entity_id, history in entity_history.items():
-            domain = entity_id.split('.')[0]
-            # Good candidates for condition entities
-            if domain in ['binary_sensor', 'sensor', 'sun', 'weather', 'person', 'device_tracker']:
-                condition_entities.add(entity_id)
+        # Sort the entity's state changes by time once for all condition entities
+        by_time = np.argsort(entity_ts, kind='stable')
+        entity_ts = entity_ts[by_time]
+        entity_states = entity_states[by_time]
+        in_order = bool(np.all(by_time[1:] > by_time[:-1]))
+        first_ts = int(entity_ts[0])
+        last_ts = int(entity_ts[-1])
         
-        # For each entity that's not a condition entity, check if its state correlates with condition entities
-        for entity_id, history in entity_history.items():
-            domain = entity_id.split('.')[0]
+        # For each condition entity, check for correlations
+        for condition_eid, condition_id, condition_ts, condition_states, condition_first, condition_last in conditions:
+            if condition_eid == eid:
+                continue
             
-            # Skip entities that can't be controlled or don't have enough history
-            if domain in ['binary_sensor', 'sensor', 'sun', 'weather'] or len(history) < self.min_occurrences:
+            # No entity change can follow a condition change if the histories don't overlap
+            if condition_first > last_ts or condition_last + 600 * _SECOND < first_ts:
                 continue
             
-            # For each condition entity, check for correlations
-            for condition_id in condition_entities:
-                if condition_id == entity_id:
-                    continue
-                
-                condition_history = entity_history.get(condition_id, [])
-                if len(condition_history) < self.min_occurrences:
+            # Map condition entity states to the target entity states that change within
+            # 10 minutes after the condition change
+            correlations = self._correlate_states(
+                condition_ts, condition_states, entity_ts, entity_states, None if in_order else by_time, len(states)
+            )
+            
+            # Total and most common target state of each condition state, ties going to the
+            # target state seen first
+            totals = Counter()
+            most_common = {}
+            for (condition_state, state), count in correlations.items():
+                totals[condition_state] += count
+                if condition_state not in most_common or count > most_common[condition_state][1]:
+                    most_common[condition_state] = (state, count)
+            
+            # Analyze correlations
+            for condition_state, (target_state, count) in most_common.items():
+                total_count = totals[condition_state]
+                if total_count < self.min_occurrences:
                     continue
                 
-                # Find conditional patterns
-                correlations = defaultdict(lambda: defaultdict(int))
-                
-                # Map condition entity states to target entity states
-                for condition_entry in condition_history:
-                    if 'state' not in condition_entry or 'last_changed' not in condition_entry:
-                        continue
-                    
-                    condition_state = condition_entry['state']
-                    condition_time = datetime.fromisoformat(condition_entry['last_changed'].replace('Z', '+00:00'))
-                    
-                    # Find entity states when condition is active
-                    for entry in history:
-                        if 'state' not in entry or 'last_changed' not in entry:
-                            continue
-                        
-                        entry_time = datetime.fromisoformat(entry['last_changed'].replace('Z', '+00:00'))
-                        
-                        # Check if entity state changes within 10 minutes after condition change
-                        if 0 <= (entry_time - condition_time).total_seconds() <= 600:
-                            correlations[condition_state][entry['state']] += 1
-                
-                # Analyze correlations
-                for condition_state, state_counts in correlations.items():
-                    if not state_counts:
-                        continue
-                    
-                    total_count = sum(state_counts.values())
-                    if total_count < self.min_occurrences:
-                        continue
-                    
-                    # Find most common target state
-                    most_common_state = max(state_counts.items(), key=lambda x: x[1])
-                    target_state, count = most_common_state
-                    
-                    confidence = count / total_count
-                    if confidence >= self.confidence_threshold:
-                        pattern = {
-                            'type': 'conditional',
-                            'entity_id': entity_id,
-                            'domain': domain,
-                            'condition_entity': condition_id,
-                            'condition_state': condition_state,
-                            'target_state': target_state,
-                            'confidence': confidence,
-                            'occurrences': count
-                        }
-                        conditional_patterns.append(pattern)
+                confidence = count / total_count
+                if confidence >= self.confidence_threshold:
+                    pattern = ConditionalPattern(
+                        entity_id=entity_id,
+                        domain=domain,
+                        condition_entity=condition_id,
+                        condition_state=states[condition_state],
+                        target_state=states[target_state],
+                        confidence=confidence,
+                        occurrences=count
+                    )
+                    conditional_patterns.append(pattern)
         
         return conditional_patterns
     
-    def discover_periodic_patterns(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    def _discover_periodic_for_entity(self, entity_id: str, domain: str, entity_ts: np.ndarray,
+                                      entity_states: np.ndarray, states: List[Any]) -> List[PeriodicPattern]:
         """
-        Discover periodic patterns where entities change at regular intervals.
+        Discover the periodic patterns of one entity.
         
         Args:
-            entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
-            
+            entity_id (str): Entity ID
+            domain (str): Domain of the entity
+            entity_ts (np.ndarray): Timestamps of the entity's entries
+            entity_states (np.ndarray): Interned state IDs of the entries
+            states (List[Any]): States by interned ID
+        
         Returns:
-            List[Dict[str, Any]]: Periodic patterns detected
+            List[PeriodicPattern]: Periodic patterns of the entity
         """
         periodic_patterns = []
         
-        for entity_id, history in entity_history.items():
-            domain = entity_id.split('.')[0]
-            
-            # Skip entities that can't be controlled or don't have enough history
-            if domain in ['binary_sensor', 'sensor', 'sun', 'weather'] or len(history) < self.min_occurrences * 2:
+        # Group the timestamps by target state, sorted within each state
+        by_state = np.lexsort((entity_ts, entity_states))
+        entity_ts = entity_ts[by_state]
+        state_ids, state_first, state_counts = np.unique(entity_states, return_index=True, return_counts=True)
+        state_starts = np.cumsum(state_counts) - state_counts
+        
+        # Look for periodic patterns for each state, in the order the states first appear
+        for s in np.argsort(state_first, kind='stable').tolist():
+            n_timestamps = int(state_counts[s])
+            if n_timestamps < self.min_occurrences * 2:
                 continue
             
-            # Extract timestamps for each target state
-            state_timestamps = defaultdict(list)
+            # Calculate intervals between consecutive timestamps, in hours for easier analysis
+            timestamps = entity_ts[state_starts[s]:state_starts[s] + n_timestamps]
+            interval_hours = np.diff(timestamps) / _SECOND / 3600
             
-            for entry in history:
-                if 'state' not in entry or 'last_changed' not in entry:
-                    continue
+            # Look for consistent intervals
+            if len(interval_hours):
+                avg_interval = float(interval_hours.mean())
                 
-                state = entry['state']
-                try:
-                    timestamp = datetime.fromisoformat(entry['last_changed'].replace('Z', '+00:00'))
-                    state_timestamps[state].append(timestamp)
-                except (ValueError, TypeError):
-                    continue
-            
-            # Look for periodic patterns for each state
-            for state, timestamps in state_timestamps.items():
-                if len(timestamps) < self.min_occurrences * 2:
+                # The standard deviation of n values is at least their range / sqrt(2n),
+                # so a wide range rules the interval out before computing it
+                spread = float(interval_hours.max() - interval_hours.min())
+                if spread > avg_interval * 0.3 * np.sqrt(2 * len(interval_hours)):
                     continue
                 
-                # Sort timestamps
-                timestamps.sort()
+                std_dev = interval_hours.std()
                 
-                # Calculate intervals between consecutive timestamps
-                intervals = [(timestamps[i] - timestamps[i-1]).total_seconds() for i in range(1, len(timestamps))]
-                
-                # Convert to hours for easier analysis
-                interval_hours = [interval / 3600 for interval in intervals]
-                
-                # Look for consistent intervals
-                if interval_hours:
-                    avg_interval = sum(interval_hours) / len(interval_hours)
-                    std_dev = np.std(interval_hours)
+                # If standard deviation is low, we have a consistent interval
+                if std_dev < avg_interval * 0.3:  # Tolerance of 30%
+                    # Round to nearest hour or half hour
+                    rounded_interval = round(avg_interval * 2) / 2
                     
-                    # If standard deviation is low, we have a consistent interval
-                    if std_dev < avg_interval * 0.3:  # Tolerance of 30%
-                        # Round to nearest hour or half hour
-                        rounded_interval = round(avg_interval * 2) / 2
-                        
-                        if rounded_interval >= 1 and rounded_interval <= 24:
-                            pattern = {
-                                'type': 'periodic',
-                                'entity_id': entity_id,
-                                'domain': domain,
-                                'state': state,
-                                'interval_hours': rounded_interval,
-                                'confidence': 1.0 - (std_dev / avg_interval),
-                                'occurrences': len(timestamps)
-                            }
-                            periodic_patterns.append(pattern)
+                    if rounded_interval >= 1 and rounded_interval <= 24:
+                        pattern = PeriodicPattern(
+                            entity_id=entity_id,
+                            domain=domain,
+                            state=states[int(state_ids[s])],
+                            interval_hours=rounded_interval,
+                            confidence=1.0 - (std_dev / avg_interval),
+                            occurrences=n_timestamps
+                        )
+                        periodic_patterns.append(pattern)
         
         return periodic_patterns
     
-    def _group_by_day_and_hour(self, history: List[Dict[str, Any]]) -> Dict[Tuple[int, int], List[str]]:
+    def _build_timeline(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> _Timeline:
         """
-        Group entity history by day of week and hour.
+        Get the timeline of entity history, parsing it only when it changed since the last call.
+        
+        The discover_* methods are usually called one after the other, or concurrently, on the same
+        history; the lock lets one of them parse it while the others wait for the result.
         
         Args:
-            history (List[Dict[str, Any]]): Entity history data
+            entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
+        
+        Returns:
+            _Timeline: Timeline of the history, as built by _parse_timeline
+        """
+        fingerprint = _history_fingerprint(entity_history)
+        with self._timeline_lock:
+            if fingerprint != self._timeline_fingerprint:
+                self._timeline = self._parse_timeline(entity_history)
+                self._timeline_fingerprint = fingerprint
+            return self._timeline
+    
+    def _parse_timeline(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> _Timeline:
+        """
+        Parse entity history once for all pattern searches, interning entity IDs and states.
+        
+        Entity IDs get consecutive IDs in the order of entity_history. Entries without a state or
+        last_changed, or with an unparseable last_changed, are dropped.
+        
+        Args:
+            entity_history (Dict[str, List[Dict[str, Any]]]): Entity history data by entity ID
+        
+        Returns:
+            _Timeline: Entity (eid_arr) and state (state_arr) IDs of the entries, their timestamp in
+                integer microseconds since the epoch (ts_arr) and its wall-clock time in the
+                timestamp's own offset, in the same unit (wall_arr)
+        """
+        entity_ids_map = {}
+        state_ids_map = {}
+        domain_ids_map = {}
+        domains = []
+        domain_ids = []
+        ts_parts = []
+        wall_parts = []
+        state_parts = []
+        
+        for entity_id, history in entity_history.items():
+            entity_ids_map[entity_id] = len(entity_ids_map)
+            # Interned, like the states, so later lookups and comparisons match by identity
+            domain = sys.intern(entity_id.partition('.')[0])
+            domains.append(domain)
+            domain_ids.append(domain_ids_map.setdefault(domain, len(domain_ids_map)))
+            history = [entry for entry in history if 'last_changed' in entry and 'state' in entry]
+            
+            # Parse the whole column at once
+            ts, wall, valid = parse_timestamps_us([entry['last_changed'] for entry in history])
+            ts_parts.append(ts[valid])
+            wall_parts.append(wall[valid])
             
+            # Intern the distinct states first, then look every entry up
+            states = [entry['state'] for entry in compress(history, valid.tolist())]
+            for state in dict.fromkeys(states):
+                state_ids_map.setdefault(state, len(state_ids_map))
+            state_parts.append(np.array([state_ids_map[state] for state in states], dtype=np.int32))
+        
+        lengths = np.array([len(part) for part in ts_parts], dtype=np.int64)
+        
+        return _Timeline(
+            entity_ids=list(entity_ids_map),
+            domains=domains,
+            states=[sys.intern(state) if type(state) is str else state for state in state_ids_map],
+            entity_ids_map=entity_ids_map,
+            domain_ids_map=domain_ids_map,
+            domain_ids=np.array(domain_ids, dtype=np.int32),
+            offsets=np.concatenate(([0], np.cumsum(lengths))),
+            eid_arr=np.repeat(np.arange(len(lengths), dtype=np.int32), lengths),
+            state_arr=np.concatenate(state_parts) if state_parts else np.empty(0, dtype=np.int32),
+            ts_arr=np.concatenate(ts_parts) if ts_parts else np.empty(0, dtype=np.int64),
+            wall_arr=np.concatenate(wall_parts) if wall_parts else np.empty(0, dtype=np.int64)
+        )
+    
+    def _correlate_states(self, condition_ts: np.ndarray, condition_states: np.ndarray, entity_ts: np.ndarray,
+                          entity_states: np.ndarray, entity_order: Optional[np.ndarray],
+                          n_states: int) -> Counter:
+        """
+        Count the entity states that change within 10 minutes after each condition state change.
+        
+        The entity changes following a condition change are found by binary search in the
+        time-sorted entity history, so only the matching pairs are visited.
+        
+        Args:
+            condition_ts (np.ndarray): Timestamps of the condition entity's entries, in history order
+            condition_states (np.ndarray): Interned states of the condition entity's entries
+            entity_ts (np.ndarray): Timestamps of the target entity's entries, in ascending order
+            entity_states (np.ndarray): Interned states of the target entity's entries, in the same order
+            entity_order (Optional[np.ndarray]): History position of each target entry, or None if
+                the history was already in time order
+            n_states (int): Number of interned states
+        
         Returns:
-            Dict[Tuple[int, int], List[str]]: Grouped state data by (day, hour)
+            Counter: Counts by (condition state, target state) pair, in the order the pairs are
+                first seen going through the condition and then the target history
         """
-        day_hour_buckets = defaultdict(list)
+        # Range of target entries within the window of each condition change
+        lo = np.searchsorted(entity_ts, condition_ts, side='left')
+        hi = np.searchsorted(entity_ts, condition_ts + 600 * _SECOND, side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if not total:
+            return Counter()
         
-        for entry in history:
-            if 'last_changed' in entry and 'state' in entry:
-                try:
-                    timestamp = datetime.fromisoformat(entry['last_changed'].replace('Z', '+00:00'))
-                    day_of_week = timestamp.weekday()  # 0=Monday, 6=Sunday
-                    hour = timestamp.hour
-                    
-                    day_hour_buckets[(day_of_week, hour)].append(entry['state'])
-                except (ValueError, TypeError):
-                    continue
+        # Expand the ranges to one row per (condition entry, target entry) pair
+        pair_starts = np.cumsum(counts) - counts
+        positions = np.repeat(lo - pair_starts, counts) + np.arange(total)
+        codes = np.repeat(condition_states.astype(np.int64) * n_states, counts) + entity_states[positions]
+        
+        # Put the pairs in history order of the target entries within each condition entry
+        if entity_order is not None:
+            codes = codes[np.lexsort((entity_order[positions], np.repeat(np.arange(len(counts)), counts)))]
+        
+        # Count every (condition state, target state) pair, keeping the order they appear in
+        pair_codes, pair_first, pair_counts = np.unique(codes, return_index=True, return_counts=True)
         
-        return day_hour_buckets
+        order = np.argsort(pair_first, kind='stable')
+        pair_codes = pair_codes[order]
+        pairs = zip((pair_codes // n_states).tolist(), (pair_codes % n_states).tolist())
+        return Counter(dict(zip(pairs, pair_counts[order].tolist())))
     
-    def _count_sequence_occurrences(self, all_entries: List[Dict[str, Any]], 
-                                   sequence: List[Dict[str, Any]]) -> int:
+    def _dominant_state_by_day_and_hour(self, wall: np.ndarray, state_ids: np.ndarray,
+                                        n_states: int) -> Dict[int, Tuple[int, int, int]]:
         """
-        Count how many times a similar sequence appears in the history.
+        Find the most common state of entity history in each day of week and hour.
         
         Args:
-            all_entries (List[Dict[str, Any]]): All history entries
-            sequence (List[Dict[str, Any]]): Sequence to look for
-            
+            wall (np.ndarray): Wall-clock times of the entity's entries, as built by _build_timeline
+            state_ids (np.ndarray): Interned state IDs of the entries
+            n_states (int): Number of interned states
+        
         Returns:
-            int: Number of occurrences
+            Dict[int, Tuple[int, int, int]]: ID of the most common state, its count and the number of
+                state changes by bucket (day * 24 + hour), in the order each bucket first appears.
+                Ties go to the state that appears first in the bucket.
         """
-        count = 0
-        seq_entities = [e['entity_id'] for e in sequence]
-        seq_states = [e['state'] for e in sequence]
+        if not len(wall):
+            return {}
         
-        # Look for similar sequences in the timeline
-        window_size = timedelta(minutes=2)
+        # Day of week (0=Monday, 6=Sunday) and hour of every wall-clock time at once
+        hours = wall // (3600 * _SECOND)
+        buckets = (((hours // 24 + 3) % 7) * 24 + hours % 24).astype(np.uint8)  # 1970-01-01 was a Thursday
         
-        for i in range(len(all_entries)):
-            if all_entries[i]['entity_id'] != seq_entities[0]:
-                continue
-                
-            if all_entries[i]['state'] != seq_states[0]:
-                continue
-            
-            # Found potential start of sequence
-            start_time = datetime.fromisoformat(all_entries[i]['timestamp'].replace('Z', '+00:00'))
-            
-            # Check if the rest of the sequence follows
-            matched = True
-            for j in range(1, len(sequence)):
-                found_match = False
-                
-                # Look for matching entity and state within the time window
-                for k in range(i + 1, len(all_entries)):
-                    entry_time = datetime.fromisoformat(all_entries[k]['timestamp'].replace('Z', '+00:00'))
-                    
-                    if (entry_time - start_time) > window_size:
-                        break
-                    
-                    if (all_entries[k]['entity_id'] == seq_entities[j] and
-                        all_entries[k]['state'] == seq_states[j]):
-                        found_match = True
-                        break
-                
-                if not found_match:
-                    matched = False
-                    break
+        # Number the entity's own states, so the count matrix only has a column per state it takes
+        local_states, local_ids = np.unique(state_ids, return_inverse=True)
+        n_local = len(local_states)
+        if n_local > _DENSE_STATES:
+            return self._dominant_state_by_bucket_sparse(buckets, state_ids, n_states)
+        
+        # Count and first position of every (bucket, state) cell of a 168 x states matrix
+        n_entries = len(buckets)
+        cells = buckets.astype(np.intp) * n_local + local_ids
+        counts = np.bincount(cells, minlength=_WEEK_HOURS * n_local).reshape(_WEEK_HOURS, n_local)
+        first = np.full(_WEEK_HOURS * n_local, n_entries, dtype=np.intp)
+        np.minimum.at(first, cells, np.arange(n_entries))
+        first = first.reshape(_WEEK_HOURS, n_local)
+        
+        # Per bucket, the state with the highest count and then the earliest first appearance
+        best_counts = counts.max(axis=1)
+        best = np.where(counts == best_counts[:, None], first, n_entries).argmin(axis=1)
+        bucket_totals = counts.sum(axis=1)
+        
+        # Buckets are listed in the order their first entry appears in the history
+        present = np.flatnonzero(bucket_totals)
+        present = present[np.argsort(first.min(axis=1)[present], kind='stable')]
+        
+        return dict(zip(
+            present.tolist(),
+            zip(local_states[best[present]].tolist(), best_counts[present].tolist(), bucket_totals[present].tolist())
+        ))
+    
+    def _dominant_state_by_bucket_sparse(self, buckets: np.ndarray, state_ids: np.ndarray,
+                                         n_states: int) -> Dict[int, Tuple[int, int, int]]:
+        """
+        Same as _dominant_state_by_day_and_hour, for entities with too many states for a dense count matrix.
+        
+        Args:
+            buckets (np.ndarray): Bucket (day * 24 + hour) of each entry
+            state_ids (np.ndarray): Interned state IDs of the entries
+            n_states (int): Number of interned states
+        
+        Returns:
+            Dict[int, Tuple[int, int, int]]: Same as _dominant_state_by_day_and_hour
+        """
+        # Count every (bucket, state) pair and find where it first appears
+        pair_codes, pair_first, pair_counts = np.unique(
+            buckets.astype(np.int64) * n_states + state_ids, return_index=True, return_counts=True
+        )
+        pair_buckets = pair_codes // n_states
+        
+        # Per bucket, the pair with the highest count and then the earliest first appearance
+        order = np.lexsort((pair_first, -pair_counts, pair_buckets))
+        sorted_buckets = pair_buckets[order]
+        best = order[np.concatenate(([True], sorted_buckets[1:] != sorted_buckets[:-1]))]
+        
+        # Sizes of the buckets, both this and best are in ascending bucket order
+        bucket_ids, bucket_first, bucket_totals = np.unique(buckets, return_index=True, return_counts=True)
+        best_states = (pair_codes[best] % n_states).tolist()
+        best_counts = pair_counts[best].tolist()
+        bucket_ids = bucket_ids.tolist()
+        bucket_totals = bucket_totals.tolist()
+        
+        # Buckets are listed in the order their first entry appears in the history
+        day_hour_states = {}
+        for b in np.argsort(bucket_first, kind='stable').tolist():
+            day_hour_states[bucket_ids[b]] = (best_states[b], best_counts[b], bucket_totals[b])
+        
+        return day_hour_states
+    
+    def _count_sequence_occurrences(self, timestamps: np.ndarray, order: np.ndarray, key_offsets: np.ndarray,
+                                   steps: np.ndarray) -> int:
+        """
+        Count how many times a similar sequence appears in the history.
+        
+        An occurrence starts at an entry matching the first step, and every other step
+        must be matched by a later entry within the time window of that start.
+        
+        Args:
+            timestamps (np.ndarray): Timestamps of the sorted timeline entries
+            order (np.ndarray): Timeline positions grouped by (entity ID, state) key
+            key_offsets (np.ndarray): Start of each key's positions in order, plus the total length
+            steps (np.ndarray): Key of each step of the sequence
             
-            if matched:
-                count += 1
+        Returns:
+            int: Number of occurrences
+        """
+        count_sequence = _get_sequence_kernel() if self.use_jit else _count_sequence_python
         
-        return count
\ No newline at end of file
+        # Look for similar sequences within 2 minutes of their start
+        return int(count_sequence(timestamps, order, key_offsets, steps, 120 * _SECOND))
\ No newline at end of file
@@ -4,18 +4,349 @@ Home Assistant Automation Suggestion Engine.
 This module provides smart automation suggestions based on entity usage patterns.
 """
 
+import asyncio
+import functools
+import heapq
 import logging
+import re
 import yaml
-import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple, Set
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Iterator
 from collections import defaultdict
+from itertools import chain, count
+from operator import itemgetter
 
 from src.automation.pattern_discovery import PatternDiscovery
-from src.automation.generator import AutomationGenerator
+from src.automation.generator import AutomationGenerator, _toggle_action, _climate_action, _generic_action
+
+try:
+    # Use the libyaml C emitter when PyYAML was built with it
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
 
 logger = logging.getLogger(__name__)
 
+# Fields read by the suggestion converters, which get complete patterns from their to_dict methods
+_DAILY_FIELDS = itemgetter('entity_id', 'state', 'day_of_week', 'hour', 'confidence')
+_SEQUENCE_FIELDS = itemgetter('steps', 'confidence')
+_CONDITIONAL_FIELDS = itemgetter('entity_id', 'condition_entity', 'condition_state', 'target_state', 'confidence')
+_PERIODIC_FIELDS = itemgetter('entity_id', 'interval_hours', 'state', 'confidence')
+
+# Sort key of suggestions, which all carry their confidence
+_CONFIDENCE = itemgetter('confidence')
+
+# Day names by day of week, 0 for Monday
+_DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Action builder for each entity domain, other domains use _generic_action
+_ACTION_BUILDERS = {
+    'light': _toggle_action,
+    'switch': _toggle_action,
+    'fan': _toggle_action,
+    'cover': _toggle_action,
+    'climate': _climate_action
+}
+
+def _build_action(domain: str, entity_id: str, state: Any) -> Dict[str, Any]:
+    """
+    Build the action setting an entity to a state, for the entity's domain.
+    
+    Args:
+        domain (str): Entity domain
+        entity_id (str): Entity ID
+        state (Any): State to set
+    
+    Returns:
+        Dict[str, Any]: Automation action
+    """
+    return _ACTION_BUILDERS.get(domain, _generic_action)(entity_id, state, domain)
+
+@functools.lru_cache(maxsize=2048)
+def _safe_id(value: str) -> str:
+    """
+    Make an entity ID or other value safe to use in a suggestion or automation ID.
+    
+    Args:
+        value (str): Value to use in the ID
+    
+    Returns:
+        str: The value with dots replaced by underscores
+    """
+    return value.replace('.', '_')
+
+@functools.lru_cache(maxsize=256)
+def _interval_str(interval_hours: Optional[float]) -> str:
+    """
+    Format an interval in hours for display, with at most one decimal.
+    
+    Args:
+        interval_hours (Optional[float]): Interval in hours
+    
+    Returns:
+        str: The interval without trailing zeros, such as "2" or "1.5"
+    """
+    return f"{interval_hours:.1f}".rstrip('0').rstrip('.') if interval_hours else "0"
+
+# Strings the YAML emitter writes plain, or single quoted when they would read as another type:
+# no indicator, quote, line break or non-ASCII characters, and no ': ' or trailing ':'
+_SIMPLE_SCALAR = re.compile(r'[A-Za-z0-9_/][A-Za-z0-9_./: ]*\Z')
+
+# Line width past which the emitter folds plain scalars at spaces
+_YAML_WIDTH = 80
+
+# Implicit tag resolver of the safe dumper, which quotes strings such as 'on' or '10:00:00'
+_yaml_resolver = yaml.resolver.Resolver()
+
+def _yaml_scalar(value: Any) -> Optional[str]:
+    """
+    Write a scalar of an automation as the YAML dumper would.
+    
+    Args:
+        value (Any): Scalar value
+    
+    Returns:
+        Optional[str]: The scalar as YAML, or None if it is not simple enough to write without the dumper
+    """
+    if type(value) is int:
+        return str(value)
+    if type(value) is not str:
+        return None
+    if not value:
+        return "''"
+    if not _SIMPLE_SCALAR.match(value) or ': ' in value or value[-1] in ' :':
+        return None
+    if _yaml_resolver.resolve(yaml.ScalarNode, value, (True, False)) == _yaml_resolver.DEFAULT_SCALAR_TAG:
+        return value
+    return f"'{value}'"
+
+def _automation_shape(node: Any, leaves: List[Any]) -> Any:
+    """
+    Get the shape of an automation, collecting its scalars in the order they are written.
+    
+    Args:
+        node (Any): Automation, or one of its values
+        leaves (List[Any]): List the scalars are appended to
+    
+    Returns:
+        Any: Hashable shape, with the keys of each mapping and the length of each list
+    """
+    if isinstance(node, dict):
+        return ('{', tuple((key, _automation_shape(value, leaves)) for key, value in node.items()))
+    if isinstance(node, list):
+        return ('[', tuple(_automation_shape(value, leaves) for value in node))
+    leaves.append(node)
+    return None
+
+@functools.lru_cache(maxsize=64)
+def _automation_template(shape: Any) -> str:
+    """
+    Render the YAML of an automation shape once, as a format string with a field per scalar.
+    
+    Args:
+        shape (Any): Shape of the automation, as returned by _automation_shape
+    
+    Returns:
+        str: Format string taking the scalars as YAML, in the order they are written
+    """
+    fields = count()
+    
+    def build(node):
+        if node is None:
+            return f"zq{next(fields)}zq"
+        kind, items = node
+        if kind == '{':
+            return {key: build(value) for key, value in items}
+        return [build(value) for value in items]
+    
+    text = yaml.dump(build(shape), Dumper=YamlDumper, sort_keys=False, default_flow_style=False)
+    return re.sub(r'zq(\d+)zq', r'{\1}', text.replace('{', '{{').replace('}', '}}'))
+
+def _dump_automation(automation: Dict[str, Any]) -> str:
+    """
+    Convert an automation to YAML, filling a template of its shape when its scalars are simple.
+    
+    Suggestion automations come in a few fixed shapes that differ only in their scalars, so the
+    emitter runs once per shape; automations with scalars the template cannot write exactly, or
+    with lines long enough to be folded, go through yaml.dump.
+    
+    Args:
+        automation (Dict[str, Any]): Automation configuration
+    
+    Returns:
+        str: Automation YAML, identical to the output of yaml.dump
+    """
+    leaves = []
+    shape = _automation_shape(automation, leaves)
+    scalars = [_yaml_scalar(value) for value in leaves]
+    if None not in scalars:
+        text = _automation_template(shape).format(*scalars)
+        if all(len(line) <= _YAML_WIDTH for line in text.splitlines()):
+            return text
+    
+    return yaml.dump(automation, Dumper=YamlDumper, sort_keys=False, default_flow_style=False)
+
+# Rendered automations, by the pattern fields they depend on, for repeated suggestion runs
+_YAML_CACHE_SIZE = 512
+
+@functools.lru_cache(maxsize=_YAML_CACHE_SIZE, typed=True)
+def _daily_automation_yaml(entity_id: str, domain: str, state: Any, day: int, hour: int) -> str:
+    """
+    Render the YAML of a daily automation.
+    
+    Args:
+        entity_id (str): Entity ID
+        domain (str): Entity domain
+        state (Any): State to set
+        day (int): Day of week, 0 for Monday
+        hour (int): Hour of day
+    
+    Returns:
+        str: Automation YAML
+    """
+    # Create a friendly name for the automation
+    day_name = _DAY_NAMES[day] if 0 <= day <= 6 else 'day'
+    
+    # Format the time with leading zero
+    time_str = f"{hour:02d}:00:00"
+    
+    # Automation ID and alias
+    auto_id = f"daily_{_safe_id(entity_id)}_{day}_{hour}"
+    alias = f"Turn {state} {entity_id} on {day_name} at {hour}:00"
+    
+    # Create the automation
+    automation = {
+        'id': auto_id,
+        'alias': alias,
+        'description': f"Automatically turn {state} the {entity_id} every {day_name} at {hour}:00",
+        'trigger': {
+            'platform': 'time',
+            'at': time_str,
+            'weekday': [day + 1]  # Home Assistant uses 1-7 for Mon-Sun
+        },
+        'action': _build_action(domain, entity_id, state)
+    }
+    
+    # Convert to YAML
+    return _dump_automation(automation)
+
+@functools.lru_cache(maxsize=_YAML_CACHE_SIZE, typed=True)
+def _sequence_automation_yaml(steps: Tuple[Tuple[str, Any, str], ...]) -> str:
+    """
+    Render the YAML of a sequence automation.
+    
+    Args:
+        steps (Tuple[Tuple[str, Any, str], ...]): Entity ID, state and domain of each step
+    
+    Returns:
+        str: Automation YAML
+    """
+    first_entity = steps[0][0] if steps else ''
+    
+    # Create a friendly name for the automation
+    auto_id = f"sequence_{_safe_id(first_entity)}_{len(steps)}"
+    alias = f"Sequence: {first_entity} and {len(steps)-1} other devices"
+    
+    # Build a list of actions
+    actions = [
+        _build_action(domain, entity_id, state)
+        for entity_id, state, domain in steps
+    ]
+    
+    # Create the automation
+    automation = {
+        'id': auto_id,
+        'alias': alias,
+        'description': f"Automation to control {len(steps)} devices in sequence",
+        'trigger': {
+            'platform': 'device',
+            'domain': 'mqtt',
+            'device_id': '',
+            'type': 'button_short_press',
+            'subtype': '1'
+        },
+        'mode': 'single',
+        'action': actions
+    }
+    
+    # Add a note to customize the trigger
+    automation['description'] += "\nNote: This automation uses a placeholder MQTT button trigger. You should customize this."
+    
+    # Convert to YAML, the multi-line description is left to the dumper
+    return yaml.dump(automation, Dumper=YamlDumper, sort_keys=False, default_flow_style=False)
+
+@functools.lru_cache(maxsize=_YAML_CACHE_SIZE, typed=True)
+def _conditional_automation_yaml(entity_id: str, domain: str, condition_entity: str,
+                                 condition_state: Any, target_state: Any) -> str:
+    """
+    Render the YAML of a conditional automation.
+    
+    Args:
+        entity_id (str): Entity ID
+        domain (str): Entity domain
+        condition_entity (str): Entity ID whose state change triggers the automation
+        condition_state (Any): State of the condition entity
+        target_state (Any): State to set
+    
+    Returns:
+        str: Automation YAML
+    """
+    # Create a friendly name for the automation
+    auto_id = f"condition_{_safe_id(entity_id)}_{_safe_id(condition_entity)}"
+    alias = f"Control {entity_id} based on {condition_entity}"
+    
+    # Create the automation
+    automation = {
+        'id': auto_id,
+        'alias': alias,
+        'description': f"Turn {target_state} the {entity_id} when {condition_entity} changes to {condition_state}",
+        'trigger': {
+            'platform': 'state',
+            'entity_id': condition_entity,
+            'to': condition_state
+        },
+        'mode': 'single',
+        'action': _build_action(domain, entity_id, target_state)
+    }
+    
+    # Convert to YAML
+    return _dump_automation(automation)
+
+@functools.lru_cache(maxsize=_YAML_CACHE_SIZE, typed=True)
+def _periodic_automation_yaml(entity_id: str, domain: str, state: Any, interval_hours: float) -> str:
+    """
+    Render the YAML of a periodic automation.
+    
+    Args:
+        entity_id (str): Entity ID
+        domain (str): Entity domain
+        state (Any): State to set
+        interval_hours (float): Interval between runs, in hours
+    
+    Returns:
+        str: Automation YAML
+    """
+    interval_str = _interval_str(interval_hours)
+    
+    # Create a friendly name for the automation
+    auto_id = f"periodic_{_safe_id(entity_id)}_{_safe_id(interval_str)}"
+    alias = f"Control {entity_id} every {interval_str} hours"
+    
+    # Create the automation
+    automation = {
+        'id': auto_id,
+        'alias': alias,
+        'description': f"Turn {state} the {entity_id} every {interval_str} hours",
+        'trigger': {
+            'platform': 'time_pattern',
+            'hours': f"/{interval_str}"
+        },
+        'mode': 'single',
+        'action': _build_action(domain, entity_id, state)
+    }
+    
+    # Convert to YAML
+    return _dump_automation(automation)
+
 class SuggestionEngine:
     """Class for generating smart automation suggestions."""
     
@@ -33,6 +364,9 @@ class SuggestionEngine:
         # Suggestion settings
         self.max_suggestions = config['automation'].get('max_suggestions', 5)
         self.min_confidence = config['automation'].get('min_confidence', 0.7)
+        
+        # Last suggestions generated, their count, and the suggestions of each entity among them
+        self._entity_index = (None, 0, {})
     
     async def generate_suggestions(self, entity_history: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
         """
@@ -44,201 +378,237 @@ class SuggestionEngine:
         Returns:
             List[Dict[str, Any]]: List of automation suggestions
         """
-        suggestions = []
-        
-        # Discover patterns
-        daily_patterns = self.pattern_discovery.discover_daily_patterns(entity_history)
-        sequence_patterns = self.pattern_discovery.discover_sequence_patterns(entity_history)
-        conditional_patterns = self.pattern_discovery.discover_conditional_patterns(entity_history)
-        periodic_patterns = self.pattern_discovery.discover_periodic_patterns(entity_history)
-        
-        # Convert patterns to suggestions
-        suggestions.extend(self._convert_daily_patterns(daily_patterns))
-        suggestions.extend(self._convert_sequence_patterns(sequence_patterns))
-        suggestions.extend(self._convert_conditional_patterns(conditional_patterns))
-        suggestions.extend(self._convert_periodic_patterns(periodic_patterns))
-        
-        # Sort by confidence and limit
-        suggestions.sort(key=lambda x: x.get('confidence', 0), reverse=True)
+        # Discover patterns concurrently in worker threads, keeping the event loop free
+        discovered = await asyncio.gather(
+            asyncio.to_thread(self.pattern_discovery.discover_daily_patterns, entity_history),
+            asyncio.to_thread(self.pattern_discovery.discover_sequence_patterns, entity_history),
+            asyncio.to_thread(self.pattern_discovery.discover_conditional_patterns, entity_history),
+            asyncio.to_thread(self.pattern_discovery.discover_periodic_patterns, entity_history)
+        )
+        
+        # Convert the patterns to dictionaries, then to suggestions, as they are consumed
+        daily_patterns, sequence_patterns, conditional_patterns, periodic_patterns = (
+            (p.to_dict() for p in patterns) for patterns in discovered
+        )
+        suggestions = chain(
+            self._iter_daily_suggestions(daily_patterns),
+            self._iter_sequence_suggestions(sequence_patterns),
+            self._iter_conditional_suggestions(conditional_patterns),
+            self._iter_periodic_suggestions(periodic_patterns)
+        )
+        
+        # Keep the most confident suggestions above the minimum confidence, in one pass
+        suggestions = heapq.nlargest(
+            self.max_suggestions,
+            (s for s in suggestions if s['confidence'] >= self.min_confidence),
+            key=_CONFIDENCE
+        )
+        
+        # Only describe and render the automations of the suggestions kept
+        for suggestion in suggestions:
+            suggestion_type = suggestion['type']
+            pattern = suggestion['pattern']
+            suggestion['title'], suggestion['description'] = self._DESCRIBERS[suggestion_type](self, pattern)
+            suggestion['yaml'] = self._YAML_GENERATORS[suggestion_type](self, pattern)
         
-        # Filter by minimum confidence
-        suggestions = [s for s in suggestions if s.get('confidence', 0) >= self.min_confidence]
+        # Index the suggestions by entity for get_suggestions_by_entity
+        entity_index = defaultdict(list)
+        for suggestion in suggestions:
+            for entity_id in dict.fromkeys(suggestion.get('entities', [])):
+                entity_index[entity_id].append(suggestion)
+        self._entity_index = (suggestions, len(suggestions), entity_index)
         
-        return suggestions[:self.max_suggestions]
+        return suggestions
     
-    def _convert_daily_patterns(self, patterns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _iter_daily_suggestions(self, patterns: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         """
-        Convert daily patterns to suggestions.
+        Convert daily patterns to suggestions, without their title, description and YAML.
         
         Args:
-            patterns (List[Dict[str, Any]]): Daily patterns
+            patterns (Iterable[Dict[str, Any]]): Daily patterns, as returned by DailyPattern.to_dict
             
-        Returns:
-            List[Dict[str, Any]]: Suggestions based on daily patterns
+        Yields:
+            Dict[str, Any]: Suggestions based on daily patterns
         """
-        suggestions = []
-        
         for pattern in patterns:
-            entity_id = pattern.get('entity_id')
-            domain = pattern.get('domain')
-            state = pattern.get('state')
-            day = pattern.get('day_of_week')
-            hour = pattern.get('hour')
-            confidence = pattern.get('confidence', 0)
+            entity_id, state, day, hour, confidence = _DAILY_FIELDS(pattern)
             
             # Skip if confidence is too low
             if confidence < self.min_confidence:
                 continue
             
             # Create a suggestion
-            day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_name = day_names[day] if 0 <= day <= 6 else 'day'
-            
-            suggestion = {
-                'id': f"daily_{entity_id.replace('.', '_')}_{day}_{hour}",
+            yield {
+                'id': f"daily_{_safe_id(entity_id)}_{day}_{hour}",
                 'type': 'daily',
-                'title': f"Turn {state} {entity_id} every {day_name} at {hour}:00",
-                'description': (
-                    f"This automation will turn {state} the {entity_id} every {day_name} "
-                    f"at {hour}:00. This pattern was detected with {confidence:.0%} confidence."
-                ),
+                'title': None,
+                'description': None,
                 'confidence': confidence,
                 'entities': [entity_id],
-                'pattern': pattern,
-                'yaml': self._generate_daily_automation_yaml(pattern)
+                'pattern': pattern
             }
-            
-            suggestions.append(suggestion)
-        
-        return suggestions
     
-    def _convert_sequence_patterns(self, patterns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _iter_sequence_suggestions(self, patterns: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         """
-        Convert sequence patterns to suggestions.
+        Convert sequence patterns to suggestions, without their title, description and YAML.
         
         Args:
-            patterns (List[Dict[str, Any]]): Sequence patterns
+            patterns (Iterable[Dict[str, Any]]): Sequence patterns, as returned by SequencePattern.to_dict
             
-        Returns:
-            List[Dict[str, Any]]: Suggestions based on sequence patterns
+        Yields:
+            Dict[str, Any]: Suggestions based on sequence patterns
         """
-        suggestions = []
-        
         for pattern in patterns:
-            steps = pattern.get('steps', [])
-            confidence = pattern.get('confidence', 0)
+            steps, confidence = _SEQUENCE_FIELDS(pattern)
             
             # Skip if confidence is too low or not enough steps
             if confidence < self.min_confidence or len(steps) < 2:
                 continue
             
             # Create a suggestion
-            first_entity = steps[0].get('entity_id', '')
-            entities = [step.get('entity_id', '') for step in steps]
+            entities = [step['entity_id'] for step in steps]
             
-            suggestion = {
-                'id': f"sequence_{first_entity.replace('.', '_')}_{len(steps)}",
+            yield {
+                'id': f"sequence_{_safe_id(entities[0])}_{len(steps)}",
                 'type': 'sequence',
-                'title': f"Create a scene with {len(steps)} devices",
-                'description': (
-                    f"This automation will create a scene that sets {len(steps)} devices to specific states. "
-                    f"The scene starts with {first_entity} and includes {', '.join(entities[1:])}. "
-                    f"This pattern was detected with {confidence:.0%} confidence."
-                ),
+                'title': None,
+                'description': None,
                 'confidence': confidence,
                 'entities': entities,
-                'pattern': pattern,
-                'yaml': self._generate_sequence_automation_yaml(pattern)
+                'pattern': pattern
             }
-            
-            suggestions.append(suggestion)
-        
-        return suggestions
     
-    def _convert_conditional_patterns(self, patterns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _iter_conditional_suggestions(self, patterns: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         """
-        Convert conditional patterns to suggestions.
+        Convert conditional patterns to suggestions, without their title, description and YAML.
         
         Args:
-            patterns (List[Dict[str, Any]]): Conditional patterns
+            patterns (Iterable[Dict[str, Any]]): Conditional patterns, as returned by ConditionalPattern.to_dict
             
-        Returns:
-            List[Dict[str, Any]]: Suggestions based on conditional patterns
+        Yields:
+            Dict[str, Any]: Suggestions based on conditional patterns
         """
-        suggestions = []
-        
         for pattern in patterns:
-            entity_id = pattern.get('entity_id')
-            condition_entity = pattern.get('condition_entity')
-            condition_state = pattern.get('condition_state')
-            target_state = pattern.get('target_state')
-            confidence = pattern.get('confidence', 0)
+            entity_id, condition_entity, _, _, confidence = _CONDITIONAL_FIELDS(pattern)
             
             # Skip if confidence is too low
             if confidence < self.min_confidence:
                 continue
             
             # Create a suggestion
-            suggestion = {
-                'id': f"condition_{entity_id.replace('.', '_')}_{condition_entity.replace('.', '_')}",
+            yield {
+                'id': f"condition_{_safe_id(entity_id)}_{_safe_id(condition_entity)}",
                 'type': 'conditional',
-                'title': f"Turn {target_state} {entity_id} when {condition_entity} is {condition_state}",
-                'description': (
-                    f"This automation will turn {target_state} the {entity_id} when {condition_entity} "
-                    f"changes to {condition_state}. This pattern was detected with {confidence:.0%} confidence."
-                ),
+                'title': None,
+                'description': None,
                 'confidence': confidence,
                 'entities': [entity_id, condition_entity],
-                'pattern': pattern,
-                'yaml': self._generate_conditional_automation_yaml(pattern)
+                'pattern': pattern
             }
-            
-            suggestions.append(suggestion)
-        
-        return suggestions
     
-    def _convert_periodic_patterns(self, patterns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _iter_periodic_suggestions(self, patterns: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         """
-        Convert periodic patterns to suggestions.
+        Convert periodic patterns to suggestions, without their title, description and YAML.
         
         Args:
-            patterns (List[Dict[str, Any]]): Periodic patterns
+            patterns (Iterable[Dict[str, Any]]): Periodic patterns, as returned by PeriodicPattern.to_dict
             
-        Returns:
-            List[Dict[str, Any]]: Suggestions based on periodic patterns
+        Yields:
+            Dict[str, Any]: Suggestions based on periodic patterns
         """
-        suggestions = []
-        
         for pattern in patterns:
-            entity_id = pattern.get('entity_id')
-            interval_hours = pattern.get('interval_hours')
-            state = pattern.get('state')
-            confidence = pattern.get('confidence', 0)
+            entity_id, interval_hours, _, confidence = _PERIODIC_FIELDS(pattern)
             
             # Skip if confidence is too low
             if confidence < self.min_confidence:
                 continue
             
             # Create a suggestion
-            interval_str = f"{interval_hours:.1f}".rstrip('0').rstrip('.') if interval_hours else "0"
-            
-            suggestion = {
-                'id': f"periodic_{entity_id.replace('.', '_')}_{interval_str.replace('.', '_')}",
+            yield {
+                'id': f"periodic_{_safe_id(entity_id)}_{_safe_id(_interval_str(interval_hours))}",
                 'type': 'periodic',
-                'title': f"Turn {state} {entity_id} every {interval_str} hours",
-                'description': (
-                    f"This automation will turn {state} the {entity_id} every {interval_str} hours. "
-                    f"This pattern was detected with {confidence:.0%} confidence."
-                ),
+                'title': None,
+                'description': None,
                 'confidence': confidence,
                 'entities': [entity_id],
-                'pattern': pattern,
-                'yaml': self._generate_periodic_automation_yaml(pattern)
+                'pattern': pattern
             }
-            
-            suggestions.append(suggestion)
+    
+    def _describe_daily_pattern(self, pattern: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Write the title and description of a daily suggestion.
         
-        return suggestions
+        Args:
+            pattern (Dict[str, Any]): Daily pattern, as returned by DailyPattern.to_dict
+        
+        Returns:
+            Tuple[str, str]: Title and description of the suggestion
+        """
+        entity_id, state, day, hour, confidence = _DAILY_FIELDS(pattern)
+        day_name = _DAY_NAMES[day] if 0 <= day <= 6 else 'day'
+        
+        return (
+            f"Turn {state} {entity_id} every {day_name} at {hour}:00",
+            f"This automation will turn {state} the {entity_id} every {day_name} "
+            f"at {hour}:00. This pattern was detected with {confidence:.0%} confidence."
+        )
+    
+    def _describe_sequence_pattern(self, pattern: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Write the title and description of a sequence suggestion.
+        
+        Args:
+            pattern (Dict[str, Any]): Sequence pattern, as returned by SequencePattern.to_dict
+        
+        Returns:
+            Tuple[str, str]: Title and description of the suggestion
+        """
+        steps, confidence = _SEQUENCE_FIELDS(pattern)
+        entities = [step['entity_id'] for step in steps]
+        
+        return (
+            f"Create a scene with {len(steps)} devices",
+            f"This automation will create a scene that sets {len(steps)} devices to specific states. "
+            f"The scene starts with {entities[0]} and includes {', '.join(entities[1:])}. "
+            f"This pattern was detected with {confidence:.0%} confidence."
+        )
+    
+    def _describe_conditional_pattern(self, pattern: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Write the title and description of a conditional suggestion.
+        
+        Args:
+            pattern (Dict[str, Any]): Conditional pattern, as returned by ConditionalPattern.to_dict
+        
+        Returns:
+            Tuple[str, str]: Title and description of the suggestion
+        """
+        entity_id, condition_entity, condition_state, target_state, confidence = _CONDITIONAL_FIELDS(pattern)
+        
+        return (
+            f"Turn {target_state} {entity_id} when {condition_entity} is {condition_state}",
+            f"This automation will turn {target_state} the {entity_id} when {condition_entity} "
+            f"changes to {condition_state}. This pattern was detected with {confidence:.0%} confidence."
+        )
+    
+    def _describe_periodic_pattern(self, pattern: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Write the title and description of a periodic suggestion.
+        
+        Args:
+            pattern (Dict[str, Any]): Periodic pattern, as returned by PeriodicPattern.to_dict
+        
+        Returns:
+            Tuple[str, str]: Title and description of the suggestion
+        """
+        entity_id, interval_hours, state, confidence = _PERIODIC_FIELDS(pattern)
+        interval_str = _interval_str(interval_hours)
+        
+        return (
+            f"Turn {state} {entity_id} every {interval_str} hours",
+            f"This automation will turn {state} the {entity_id} every {interval_str} hours. "
+            f"This pattern was detected with {confidence:.0%} confidence."
+        )
     
     def _generate_daily_automation_yaml(self, pattern: Dict[str, Any]) -> str:
         """
@@ -250,69 +620,8 @@ class SuggestionEngine:
         Returns:
             str: Automation YAML
         """
-        entity_id = pattern.get('entity_id')
-        domain = pattern.get('domain')
-        state = pattern.get('state')
-        day = pattern.get('day_of_week')
-        hour = pattern.get('hour')
-        
-        # Create a friendly name for the automation
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        day_name = day_names[day] if 0 <= day <= 6 else 'day'
-        
-        # Format the time with leading zero
-        time_str = f"{hour:02d}:00:00"
-        
-        # Automation ID and alias
-        auto_id = f"daily_{entity_id.replace('.', '_')}_{day}_{hour}"
-        alias = f"Turn {state} {entity_id} on {day_name} at {hour}:00"
-        
-        # Create the automation
-        automation = {
-            'id': auto_id,
-            'alias': alias,
-            'description': f"Automatically turn {state} the {entity_id} every {day_name} at {hour}:00",
-            'trigger': {
-                'platform': 'time',
-                'at': time_str,
-                'weekday': [day + 1]  # Home Assistant uses 1-7 for Mon-Sun
-            },
-            'action': {}
-        }
-        
-        # Set the action based on domain and state
-        if domain in ['light', 'switch', 'fan', 'cover']:
-            service = f"{domain}.turn_on" if state == 'on' else f"{domain}.turn_off"
-            automation['action'] = {
-                'service': service,
-                'target': {
-                    'entity_id': entity_id
-                }
-            }
-        elif domain == 'climate':
-            automation['action'] = {
-                'service': 'climate.set_hvac_mode',
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'hvac_mode': state
-                }
-            }
-        else:
-            # Generic service call
-            automation['action'] = {
-                'service': f"{domain}.set_state",
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'state': state
-                }
-            }
-        
-        # Convert to YAML
-        return yaml.dump(automation, sort_keys=False, default_flow_style=False)
+        return _daily_automation_yaml(pattern.get('entity_id'), pattern.get('domain'), pattern.get('state'),
+                                      pattern.get('day_of_week'), pattern.get('hour'))
     
     def _generate_sequence_automation_yaml(self, pattern: Dict[str, Any]) -> str:
         """
@@ -324,71 +633,11 @@ class SuggestionEngine:
         Returns:
             str: Automation YAML
         """
-        steps = pattern.get('steps', [])
-        first_entity = steps[0].get('entity_id', '') if steps else ''
-        
-        # Create a friendly name for the automation
-        auto_id = f"sequence_{first_entity.replace('.', '_')}_{len(steps)}"
-        alias = f"Sequence: {first_entity} and {len(steps)-1} other devices"
-        
-        # Build a list of actions
-        actions = []
-        for step in steps:
-            entity_id = step.get('entity_id', '')
-            state = step.get('state', '')
-            domain = step.get('domain', '')
-            
-            if domain in ['light', 'switch', 'fan', 'cover']:
-                service = f"{domain}.turn_on" if state == 'on' else f"{domain}.turn_off"
-                actions.append({
-                    'service': service,
-                    'target': {
-                        'entity_id': entity_id
-                    }
-                })
-            elif domain == 'climate':
-                actions.append({
-                    'service': 'climate.set_hvac_mode',
-                    'target': {
-                        'entity_id': entity_id
-                    },
-                    'data': {
-                        'hvac_mode': state
-                    }
-                })
-            else:
-                # Generic service call
-                actions.append({
-                    'service': f"{domain}.set_state",
-                    'target': {
-                        'entity_id': entity_id
-                    },
-                    'data': {
-                        'state': state
-                    }
-                })
-        
-        # Create the automation
-        automation = {
-            'id': auto_id,
-            'alias': alias,
-            'description': f"Automation to control {len(steps)} devices in sequence",
-            'trigger': {
-                'platform': 'device',
-                'domain': 'mqtt',
-                'device_id': '',
-                'type': 'button_short_press',
-                'subtype': '1'
-            },
-            'mode': 'single',
-            'action': actions
-        }
-        
-        # Add a note to customize the trigger
-        automation['description'] += "\nNote: This automation uses a placeholder MQTT button trigger. You should customize this."
-        
-        # Convert to YAML
-        return yaml.dump(automation, sort_keys=False, default_flow_style=False)
+        steps = tuple(
+            (step.get('entity_id', ''), step.get('state', ''), step.get('domain', ''))
+            for step in pattern.get('steps', [])
+        )
+        return _sequence_automation_yaml(steps)
     
     def _generate_conditional_automation_yaml(self, pattern: Dict[str, Any]) -> str:
         """
@@ -400,63 +649,9 @@ class SuggestionEngine:
         Returns:
             str: Automation YAML
         """
-        entity_id = pattern.get('entity_id')
-        domain = pattern.get('domain')
-        condition_entity = pattern.get('condition_entity')
-        condition_state = pattern.get('condition_state')
-        target_state = pattern.get('target_state')
-        
-        # Create a friendly name for the automation
-        auto_id = f"condition_{entity_id.replace('.', '_')}_{condition_entity.replace('.', '_')}"
-        alias = f"Control {entity_id} based on {condition_entity}"
-        
-        # Create the automation
-        automation = {
-            'id': auto_id,
-            'alias': alias,
-            'description': f"Turn {target_state} the {entity_id} when {condition_entity} changes to {condition_state}",
-            'trigger': {
-                'platform': 'state',
-                'entity_id': condition_entity,
-                'to': condition_state
-            },
-            'mode': 'single',
-            'action': {}
-        }
-        
-        # Set the action based on domain and state
-        if domain in ['light', 'switch', 'fan', 'cover']:
-            service = f"{domain}.turn_on" if target_state == 'on' else f"{domain}.turn_off"
-            automation['action'] = {
-                'service': service,
-                'target': {
-                    'entity_id': entity_id
-                }
-            }
-        elif domain == 'climate':
-            automation['action'] = {
-                'service': 'climate.set_hvac_mode',
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'hvac_mode': target_state
-                }
-            }
-        else:
-            # Generic service call
-            automation['action'] = {
-                'service': f"{domain}.set_state",
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'state': target_state
-                }
-            }
-        
-        # Convert to YAML
-        return yaml.dump(automation, sort_keys=False, default_flow_style=False)
+        return _conditional_automation_yaml(pattern.get('entity_id'), pattern.get('domain'),
+                                            pattern.get('condition_entity'), pattern.get('condition_state'),
+                                            pattern.get('target_state'))
     
     def _generate_periodic_automation_yaml(self, pattern: Dict[str, Any]) -> str:
         """
@@ -468,67 +663,24 @@ class SuggestionEngine:
         Returns:
             str: Automation YAML
         """
-        entity_id = pattern.get('entity_id')
-        domain = pattern.get('domain')
-        interval_hours = pattern.get('interval_hours')
-        state = pattern.get('state')
-        
-        # Format interval for display
-        interval_str = f"{interval_hours:.1f}".rstrip('0').rstrip('.') if interval_hours else "0"
-        
-        # Create a friendly name for the automation
-        auto_id = f"periodic_{entity_id.replace('.', '_')}_{interval_str.replace('.', '_')}"
-        alias = f"Control {entity_id} every {interval_str} hours"
-        
-        # Convert hours to minutes for timer
-        interval_minutes = int(interval_hours * 60) if interval_hours else 60
-        
-        # Create the automation
-        automation = {
-            'id': auto_id,
-            'alias': alias,
-            'description': f"Turn {state} the {entity_id} every {interval_str} hours",
-            'trigger': {
-                'platform': 'time_pattern',
-                'hours': f"/{interval_str}"
-            },
-            'mode': 'single',
-            'action': {}
-        }
-        
-        # Set the action based on domain and state
-        if domain in ['light', 'switch', 'fan', 'cover']:
-            service = f"{domain}.turn_on" if state == 'on' else f"{domain}.turn_off"
-            automation['action'] = {
-                'service': service,
-                'target': {
-                    'entity_id': entity_id
-                }
-            }
-        elif domain == 'climate':
-            automation['action'] = {
-                'service': 'climate.set_hvac_mode',
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'hvac_mode': state
-                }
-            }
-        else:
-            # Generic service call
-            automation['action'] = {
-                'service': f"{domain}.set_state",
-                'target': {
-                    'entity_id': entity_id
-                },
-                'data': {
-                    'state': state
-                }
-            }
-        
-        # Convert to YAML
-        return yaml.dump(automation, sort_keys=False, default_flow_style=False)
+        return _periodic_automation_yaml(pattern.get('entity_id'), pattern.get('domain'), pattern.get('state'),
+                                         pattern.get('interval_hours'))
+    
+    # Title and description writer for each suggestion type
+    _DESCRIBERS = {
+        'daily': _describe_daily_pattern,
+        'sequence': _describe_sequence_pattern,
+        'conditional': _describe_conditional_pattern,
+        'periodic': _describe_periodic_pattern
+    }
+    
+    # YAML generator for each suggestion type
+    _YAML_GENERATORS = {
+        'daily': _generate_daily_automation_yaml,
+        'sequence': _generate_sequence_automation_yaml,
+        'conditional': _generate_conditional_automation_yaml,
+        'periodic': _generate_periodic_automation_yaml
+    }
     
     def get_suggestion_categories(self, suggestions: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         """
@@ -547,10 +699,11 @@ class SuggestionEngine:
             'periodic': []
         }
         
+        # Suggestions of unknown types are left out
         for suggestion in suggestions:
-            suggestion_type = suggestion.get('type', 'unknown')
-            if suggestion_type in categories:
-                categories[suggestion_type].append(suggestion)
+            category = categories.get(suggestion.get('type'))
+            if category is not None:
+                category.append(suggestion)
         
         return categories
     
@@ -565,6 +718,11 @@ class SuggestionEngine:
         Returns:
             List[Dict[str, Any]]: Suggestions related to the entity
         """
+        # Look the entity up when given the list returned by the last generate_suggestions call
+        indexed, count, entity_index = self._entity_index
+        if suggestions is indexed and len(suggestions) == count:
+            return list(entity_index.get(entity_id, []))
+        
         entity_suggestions = []
         
         for suggestion in suggestions:
@@ -4,92 +4,141 @@ Home Assistant Automation Test Runner.
 This module provides functionality for testing automations before deploying them.
 """
 
+import copy
+import hashlib
 import logging
+import re
+import time
 import yaml
-import tempfile
-import os
 import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple, Set
+from typing import Dict, List, Any, Optional, Tuple, Set, Union
 
 from src.connection.api import HomeAssistantAPI
 from src.testing.validator import ConfigValidator
 
 logger = logging.getLogger(__name__)
 
+try:
+    # Use the libyaml C parser when PyYAML was built with it
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+    logger.warning("PyYAML was built without libyaml; automation YAML will be parsed in pure Python")
+
+# Keys whose string values are templates
+_TEMPLATE_KEYS = frozenset({'value_template', 'template', 'wait_template'})
+
+# Longest prefix of a template with every quote closed: text outside quotes, then
+# quoted strings each followed by more such text. A quote of one kind may appear
+# inside a string quoted with the other kind.
+_CLOSED_QUOTES_RE = re.compile(r"""[^"']*(?:(?:"[^"]*"|'[^']*')[^"']*)*""")
+
+# Trigger times datetime.strptime(time_at, '%H:%M:%S') accepts, written with ASCII digits
+_TIME_RE = re.compile(r'(2[0-3]|[01][0-9]|[0-9]):([0-5][0-9]|[0-9]):([0-5][0-9]|[0-9])\Z')
+
+# Seconds that states fetched from the API are reused for further simulations
+_STATES_TTL = 2.0
+
+# Most entities whose states are fetched one by one instead of fetching all states
+_MAX_ENTITY_FETCHES = 8
+
+# Number of validation results each validate_* method keeps for YAML validated again unchanged
+_RESULT_CACHE_SIZE = 128
+
+# Seconds that validation results checked against the API are reused, since entities and
+# services can be added or removed in the meantime
+_API_RESULT_TTL = 30.0
+
+def _content_key(automation_yaml: Union[str, bytes]) -> bytes:
+    """
+    Hash automation YAML to look up the validation results cached for it.
+    
+    Args:
+        automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
+    
+    Returns:
+        bytes: 16-byte BLAKE2b digest
+    """
+    if isinstance(automation_yaml, str):
+        automation_yaml = automation_yaml.encode('utf-8')
+    return hashlib.blake2b(automation_yaml, digest_size=16).digest()
+
 class AutomationTestRunner:
     """Class for testing Home Assistant automations."""
     
-    def __init__(self, config: Dict[str, Any], api: HomeAssistantAPI = None):
+    def __init__(self, config: Dict[str, Any], api: HomeAssistantAPI = None,
+                 validator: ConfigValidator = None):
         """
         Initialize the automation test runner.
         
         Args:
             config (Dict[str, Any]): Configuration dictionary
             api (HomeAssistantAPI, optional): Home Assistant API instance
+            validator (ConfigValidator, optional): Configuration validator, created on the
+                runner's API if not given so both share one HTTP session
         """
         self.config = config
         self.api = api or HomeAssistantAPI(config)
-        self.validator = ConfigValidator(config)
+        self.validator = validator or ConfigValidator(config, self.api)
+        
+        # Most recently parsed YAML and its document, see _parse
+        self._last_parsed: Tuple[Optional[Union[str, bytes]], Any] = (None, None)
+        
+        # Validation results with the monotonic time they expire at, or None if they only
+        # depend on the YAML, by content hash of the YAML, least recently used first
+        self._validation_cache: OrderedDict = OrderedDict()
+        self._template_cache: OrderedDict = OrderedDict()
+        
+        # Futures of the validate_automation_yaml calls running, by content hash of the YAML
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        
+        # Monotonic time and states of the last fetch of all entity states
+        self._states_cache: Optional[Tuple[float, Dict[str, Any]]] = None
     
-    async def validate_automation_yaml(self, automation_yaml: str) -> Dict[str, Any]:
+    async def validate_automation_yaml(self, automation_yaml: Union[str, bytes]) -> Dict[str, Any]:
         """
         Validate automation YAML syntax and check for common issues.
         
         Args:
-            automation_yaml (str): Automation YAML content
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
             
         Returns:
             Dict[str, Any]: Validation results
         """
-        results = {
-            'valid': False,
-            'errors': [],
-            'warnings': [],
-            'entities': []
-        }
-        
-        # Basic validation
-        valid, error = self.validator.validate_automation_config(automation_yaml)
-        results['valid'] = valid
-        
-        if not valid:
-            results['errors'].append(error)
-            return results
-        
-        # Advanced validation using the validator API
+        key = _content_key(automation_yaml)
+        cached = self._get_cached_result(self._validation_cache, key)
+        if cached is not None:
+            return cached
+        
+        # Wait for a validation of the same YAML that is already running instead of repeating it.
+        # The wait is shielded, so cancelling this call does not cancel the running validation.
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            results = await asyncio.shield(inflight)
+            if results is not None:
+                return copy.deepcopy(results)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        results = None
         try:
-            validation_results = await self.validator.validate_config_against_api('automation', automation_yaml)
-            results['valid'] = validation_results.get('valid', False)
-            results['errors'].extend(validation_results.get('errors', []))
-            results['warnings'].extend(validation_results.get('warnings', []))
-            
-            # Extract referenced entities
-            if 'referenced_entities' in validation_results:
-                results['entities'] = validation_results['referenced_entities']
-            
-            # Check for invalid entities
-            if 'invalid_entities' in validation_results and validation_results['invalid_entities']:
-                for entity in validation_results['invalid_entities']:
-                    results['warnings'].append(f"Referenced entity '{entity}' doesn't exist")
-            
-            # Check for invalid services
-            if 'invalid_services' in validation_results and validation_results['invalid_services']:
-                for service in validation_results['invalid_services']:
-                    results['warnings'].append(f"Referenced service '{service}' doesn't exist")
-        
-        except Exception as e:
-            logger.error(f"Error validating automation against API: {e}")
-            results['warnings'].append(f"Could not perform advanced validation: {str(e)}")
+            results = await self._validate_automation_yaml(automation_yaml, key)
+        finally:
+            # Calls waiting on a validation that failed get None and validate the YAML themselves
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            future.set_result(copy.deepcopy(results))
         
         return results
     
-    async def dry_run_automation(self, automation_yaml: str) -> Dict[str, Any]:
+    async def dry_run_automation(self, automation_yaml: Union[str, bytes]) -> Dict[str, Any]:
         """
         Perform a dry run of an automation to predict what would happen.
         
         Args:
-            automation_yaml (str): Automation YAML content
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
             
         Returns:
             Dict[str, Any]: Dry run results
@@ -104,7 +153,7 @@ class AutomationTestRunner:
         
         try:
             # Parse the automation
-            automation = yaml.safe_load(automation_yaml)
+            automation = self._parse(automation_yaml)
             
             # Handle single automation or list
             if isinstance(automation, list):
@@ -150,12 +199,12 @@ class AutomationTestRunner:
         
         return results
     
-    async def simulate_automation_execution(self, automation_yaml: str) -> Dict[str, Any]:
+    async def simulate_automation_execution(self, automation_yaml: Union[str, bytes]) -> Dict[str, Any]:
         """
         Simulate the execution of an automation to see what states would be changed.
         
         Args:
-            automation_yaml (str): Automation YAML content
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
             
         Returns:
             Dict[str, Any]: Simulation results
@@ -168,20 +217,6 @@ class AutomationTestRunner:
         }
         
         try:
-            # Get current states of all entities
-            try:
-                entity_states = await self.api.get_states()
-                current_states = {entity['entity_id']: entity.get('state', 'unknown') for entity in entity_states}
-            except Exception as e:
-                logger.warning(f"Could not get entity states from API: {e}")
-                current_states = {}
-                results['warning'] = "Could not get current entity states. Using placeholders."
-            
-            # Create a temporary file for the automation
-            with tempfile.NamedTemporaryFile(suffix='.yaml', delete=False) as temp_file:
-                temp_file.write(automation_yaml.encode('utf-8'))
-                temp_file_path = temp_file.name
-            
             # Simulate execution
             dry_run = await self.dry_run_automation(automation_yaml)
             
@@ -189,6 +224,19 @@ class AutomationTestRunner:
                 results['error'] = dry_run.get('error', "Dry run failed")
                 return results
             
+            # Get current states of the entities the actions change, an empty ID names no entity
+            entity_ids = list(dict.fromkeys(
+                action['entity_id'] for action in dry_run.get('actions', [])
+                if action.get('type') == 'service_call' and isinstance(action.get('entity_id'), str)
+                and action['entity_id']
+            ))
+            try:
+                current_states = await self._get_current_states(entity_ids)
+            except Exception as e:
+                logger.warning(f"Could not get entity states from API: {e}")
+                current_states = {}
+                results['warning'] = "Could not get current entity states. Using placeholders."
+            
             # Build simulation steps
             simulation_steps = []
             
@@ -252,21 +300,18 @@ class AutomationTestRunner:
             results['steps'] = simulation_steps
             results['success'] = True
             
-            # Clean up temp file
-            os.unlink(temp_file_path)
-            
         except Exception as e:
             logger.error(f"Error in simulation: {e}")
             results['error'] = str(e)
         
         return results
     
-    async def test_automation_trigger(self, automation_yaml: str) -> Dict[str, Any]:
+    async def test_automation_trigger(self, automation_yaml: Union[str, bytes]) -> Dict[str, Any]:
         """
         Test if an automation trigger can be activated.
         
         Args:
-            automation_yaml (str): Automation YAML content
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
             
         Returns:
             Dict[str, Any]: Trigger test results
@@ -282,7 +327,7 @@ class AutomationTestRunner:
         
         try:
             # Parse the automation
-            automation = yaml.safe_load(automation_yaml)
+            automation = self._parse(automation_yaml)
             
             # Handle single automation or list
             if isinstance(automation, list):
@@ -329,8 +374,14 @@ class AutomationTestRunner:
                 
                 if time_at:
                     now = datetime.now()
-                    target_time = datetime.strptime(time_at, '%H:%M:%S').replace(
-                        year=now.year, month=now.month, day=now.day)
+                    match = _TIME_RE.match(time_at) if isinstance(time_at, str) else None
+                    if match:
+                        hour, minute, second = map(int, match.groups())
+                        target_time = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+                    else:
+                        # Leave anything else to strptime, which parses or rejects it as before
+                        target_time = datetime.strptime(time_at, '%H:%M:%S').replace(
+                            year=now.year, month=now.month, day=now.day)
                     
                     # If target time is in the past today, add a day
                     if target_time < now:
@@ -391,16 +442,21 @@ class AutomationTestRunner:
         
         return results
     
-    async def validate_automation_templates(self, automation_yaml: str) -> Dict[str, Any]:
+    async def validate_automation_templates(self, automation_yaml: Union[str, bytes]) -> Dict[str, Any]:
         """
         Validate templates used in an automation.
         
         Args:
-            automation_yaml (str): Automation YAML content
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
             
         Returns:
             Dict[str, Any]: Template validation results
         """
+        key = _content_key(automation_yaml)
+        cached = self._get_cached_result(self._template_cache, key)
+        if cached is not None:
+            return cached
+        
         results = {
             'valid': True,
             'templates': [],
@@ -410,23 +466,25 @@ class AutomationTestRunner:
         
         try:
             # Parse the automation
-            automation = yaml.safe_load(automation_yaml)
+            automation = self._parse(automation_yaml)
             
             # Handle single automation or list
             if isinstance(automation, list):
                 if not automation:
+                    self._cache_result(self._template_cache, key, results)
                     return results
                 automation = automation[0]
             
             if not isinstance(automation, dict):
                 results['errors'].append("Invalid automation format")
                 results['valid'] = False
+                self._cache_result(self._template_cache, key, results)
                 return results
             
             # Extract templates from the automation
             templates = self._find_templates_in_object(automation)
             
-            # Validate each template
+            # Validate each template, and warn about unescaped curly braces
             for location, template in templates:
                 try:
                     # Try to render the template (works only with API)
@@ -451,9 +509,7 @@ class AutomationTestRunner:
                     
                     results['errors'].append(f"Template error in {location}: {str(e)}")
                     results['valid'] = False
-            
-            # Add warnings for unescaped curly braces
-            for location, template in templates:
+                
                 if '{{' not in template and '{' in template:
                     results['warnings'].append(
                         f"Possible unescaped curly brace in {location}: {template}"
@@ -464,8 +520,175 @@ class AutomationTestRunner:
             results['errors'].append(str(e))
             results['valid'] = False
         
+        self._cache_result(self._template_cache, key, results)
+        return results
+    
+    async def _validate_automation_yaml(self, automation_yaml: Union[str, bytes], key: bytes) -> Dict[str, Any]:
+        """
+        Validate automation YAML that is neither cached nor being validated already.
+        
+        Args:
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
+            key (bytes): Content hash of the YAML
+        
+        Returns:
+            Dict[str, Any]: Validation results
+        """
+        # The validator works on text
+        if isinstance(automation_yaml, bytes):
+            automation_yaml = automation_yaml.decode('utf-8')
+        
+        results = {
+            'valid': False,
+            'errors': [],
+            'warnings': [],
+            'entities': []
+        }
+        
+        # Basic validation
+        valid, error = self.validator.validate_automation_config(automation_yaml)
+        results['valid'] = valid
+        
+        if not valid:
+            results['errors'].append(error)
+            self._cache_result(self._validation_cache, key, results)
+            return results
+        
+        # Advanced validation using the validator API
+        try:
+            validation_results = await self.validator.validate_config_against_api('automation', automation_yaml)
+            results['valid'] = validation_results.get('valid', False)
+            results['errors'].extend(validation_results.get('errors', []))
+            results['warnings'].extend(validation_results.get('warnings', []))
+            
+            # Extract referenced entities
+            if 'referenced_entities' in validation_results:
+                results['entities'] = validation_results['referenced_entities']
+            
+            # Check for invalid entities
+            if 'invalid_entities' in validation_results and validation_results['invalid_entities']:
+                for entity in validation_results['invalid_entities']:
+                    results['warnings'].append(f"Referenced entity '{entity}' doesn't exist")
+            
+            # Check for invalid services
+            if 'invalid_services' in validation_results and validation_results['invalid_services']:
+                for service in validation_results['invalid_services']:
+                    results['warnings'].append(f"Referenced service '{service}' doesn't exist")
+        
+        except Exception as e:
+            logger.error(f"Error validating automation against API: {e}")
+            results['warnings'].append(f"Could not perform advanced validation: {str(e)}")
+            
+            # The API may be back for the next call, so the results are not cached
+            return results
+        
+        self._cache_result(self._validation_cache, key, results, ttl=_API_RESULT_TTL)
         return results
     
+    def _parse(self, automation_yaml: Union[str, bytes]) -> Any:
+        """
+        Parse automation YAML, reusing the document of the previous call for the same YAML.
+        
+        Callers usually run several of the test methods on one automation in a row,
+        so keeping only the last document avoids parsing it again for each of them.
+        Each call gets its own deep copy, which is several times cheaper than parsing,
+        so results built from it never share objects with the kept document.
+        
+        Args:
+            automation_yaml (Union[str, bytes]): Automation YAML content, as text or UTF-8 bytes
+        
+        Returns:
+            Any: Parsed YAML document
+        """
+        last_yaml, document = self._last_parsed
+        if last_yaml is None or automation_yaml != last_yaml:
+            document = yaml.load(automation_yaml, Loader=YamlLoader)
+            self._last_parsed = (automation_yaml, document)
+        
+        return copy.deepcopy(document)
+    
+    async def _get_current_states(self, entity_ids: List[str]) -> Dict[str, Any]:
+        """
+        Get the current states of entities.
+        
+        A few entities are fetched concurrently one by one, rather than transferring the
+        states of every entity. Otherwise all states are fetched, and reused for
+        _STATES_TTL seconds so that simulations run in a row share one fetch.
+        
+        Args:
+            entity_ids (List[str]): IDs of the entities to get the states of
+        
+        Returns:
+            Dict[str, Any]: States by entity ID, with entities missing from the API left out
+        
+        Raises:
+            Exception: If a request to the API fails, so the caller can warn about it
+        """
+        cached = self._states_cache
+        if cached is not None and time.monotonic() - cached[0] < _STATES_TTL:
+            return cached[1]
+        
+        if not entity_ids:
+            return {}
+        
+        if len(entity_ids) <= _MAX_ENTITY_FETCHES:
+            # Missing entities come back as None, any other failed request raises
+            entity_states = await asyncio.gather(*(
+                self.api.get_entity_state(entity_id, missing_ok=True) for entity_id in entity_ids
+            ))
+            return {
+                entity_id: entity.get('state', 'unknown')
+                for entity_id, entity in zip(entity_ids, entity_states)
+                if entity
+            }
+        
+        entity_states = await self.api.get_states()
+        current_states = {entity['entity_id']: entity.get('state', 'unknown') for entity in entity_states}
+        self._states_cache = (time.monotonic(), current_states)
+        
+        return current_states
+    
+    def _get_cached_result(self, cache: OrderedDict, key: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Get a copy of cached validation results and mark them as recently used.
+        
+        Args:
+            cache (OrderedDict): Validation result cache of a validate_* method
+            key (bytes): Content hash of the YAML
+        
+        Returns:
+            Optional[Dict[str, Any]]: Copy of the results, or None if the YAML is not cached
+                or its results have expired
+        """
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, results = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del cache[key]
+            return None
+        
+        cache.move_to_end(key)
+        return copy.deepcopy(results)
+    
+    def _cache_result(self, cache: OrderedDict, key: bytes, results: Dict[str, Any],
+                      ttl: Optional[float] = None) -> None:
+        """
+        Cache a copy of validation results, evicting the least recently used ones when full.
+        
+        Args:
+            cache (OrderedDict): Validation result cache of a validate_* method
+            key (bytes): Content hash of the YAML
+            results (Dict[str, Any]): Validation results to cache
+            ttl (Optional[float], optional): Seconds the results are valid for, or None if they
+                only depend on the YAML
+        """
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        cache[key] = (expires_at, copy.deepcopy(results))
+        if len(cache) > _RESULT_CACHE_SIZE:
+            cache.popitem(last=False)
+    
     def _analyze_trigger(self, triggers: List[Dict[str, Any]]) -> str:
         """
         Create a human-readable description of the triggers.
@@ -559,107 +782,26 @@ class AutomationTestRunner:
             if not isinstance(action, dict):
                 continue
             
-            # Service call action
-            if 'service' in action:
-                service = action['service']
-                
-                # Extract entity ID
-                entity_id = None
-                
-                if 'entity_id' in action:
-                    entity_id = action['entity_id']
-                elif 'target' in action and 'entity_id' in action['target']:
-                    entity_id = action['target']['entity_id']
-                
-                # Extract additional data
-                data = action.get('data', {})
-                
-                action_info = {
-                    'type': 'service_call',
-                    'service': service,
-                    'entity_id': entity_id,
-                    'data': data
-                }
-                
-                results['actions'].append(action_info)
-                
-                # Track affected entities
-                if entity_id:
-                    if isinstance(entity_id, list):
-                        results['entities'].extend(entity_id)
-                    else:
-                        results['entities'].append(entity_id)
-            
-            # Delay action
-            elif 'delay' in action:
-                delay = action['delay']
-                
-                if isinstance(delay, (int, float)):
-                    delay_str = f"{delay} seconds"
-                else:
-                    delay_str = str(delay)
-                
-                action_info = {
-                    'type': 'delay',
-                    'delay': delay_str
-                }
-                
-                results['actions'].append(action_info)
-            
-            # Scene action
-            elif 'scene' in action:
-                scene = action['scene']
-                
-                action_info = {
-                    'type': 'scene',
-                    'scene': scene
-                }
-                
-                results['actions'].append(action_info)
-                results['entities'].append(f"scene.{scene}")
-            
-            # Wait template action
-            elif 'wait_template' in action:
-                template = action['wait_template']
-                
-                action_info = {
-                    'type': 'wait_template',
-                    'template': template
-                }
-                
-                results['actions'].append(action_info)
-            
-            # Condition action
-            elif 'condition' in action:
-                condition = action['condition']
-                
-                action_info = {
-                    'type': 'condition',
-                    'condition': condition
-                }
-                
-                results['actions'].append(action_info)
-            
-            # Other action types
+            # Dispatch on the first action key the action has
+            for key, analyze in self._ACTION_ANALYZERS.items():
+                if key in action:
+                    analyze(self, action, key, results)
+                    break
             else:
-                # Try to identify the action type
-                for key in ['device_id', 'event', 'repeat', 'choose', 'variables']:
-                    if key in action:
-                        action_info = {
-                            'type': key,
-                            'details': action[key]
-                        }
-                        
-                        results['actions'].append(action_info)
-                        break
-                else:
-                    # Unknown action type
-                    results['actions'].append({
-                        'type': 'unknown',
-                        'details': action
-                    })
-                    
-                    results['warnings'].append("Unknown action type detected")
+                # Unknown action type
+                results['actions'].append({
+                    'type': 'unknown',
+                    'details': action
+                })
+                
+                results['warnings'].append("Unknown action type detected")
+        
+        # List each affected entity once, in the order the actions first affect it
+        try:
+            results['entities'] = list(dict.fromkeys(results['entities']))
+        except TypeError:
+            # Malformed entity IDs, such as mappings, are left as they are
+            pass
         
         # Check for issues
         if not actions:
@@ -667,9 +809,142 @@ class AutomationTestRunner:
         
         return results
     
+    def _analyze_service_action(self, action: Dict[str, Any], key: str, results: Dict[str, Any]) -> None:
+        """
+        Analyze a service call action.
+        
+        Args:
+            action (Dict[str, Any]): Action configuration
+            key (str): Action key the action was dispatched on
+            results (Dict[str, Any]): Analysis results to add the action and its entities to
+        """
+        service = action['service']
+        
+        # Extract entity ID
+        entity_id = None
+        
+        if 'entity_id' in action:
+            entity_id = action['entity_id']
+        elif 'target' in action and 'entity_id' in action['target']:
+            entity_id = action['target']['entity_id']
+        
+        # Extract additional data
+        data = action.get('data', {})
+        
+        action_info = {
+            'type': 'service_call',
+            'service': service,
+            'entity_id': entity_id,
+            'data': data
+        }
+        
+        results['actions'].append(action_info)
+        
+        # Track affected entities
+        if entity_id:
+            if isinstance(entity_id, list):
+                results['entities'].extend(entity_id)
+            else:
+                results['entities'].append(entity_id)
+    
+    def _analyze_delay_action(self, action: Dict[str, Any], key: str, results: Dict[str, Any]) -> None:
+        """
+        Analyze a delay action.
+        
+        Args:
+            action (Dict[str, Any]): Action configuration
+            key (str): Action key the action was dispatched on
+            results (Dict[str, Any]): Analysis results to add the action to
+        """
+        delay = action['delay']
+        
+        if isinstance(delay, (int, float)):
+            delay_str = f"{delay} seconds"
+        else:
+            delay_str = str(delay)
+        
+        results['actions'].append({
+            'type': 'delay',
+            'delay': delay_str
+        })
+    
+    def _analyze_scene_action(self, action: Dict[str, Any], key: str, results: Dict[str, Any]) -> None:
+        """
+        Analyze a scene action.
+        
+        Args:
+            action (Dict[str, Any]): Action configuration
+            key (str): Action key the action was dispatched on
+            results (Dict[str, Any]): Analysis results to add the action and its scene to
+        """
+        scene = action['scene']
+        
+        results['actions'].append({
+            'type': 'scene',
+            'scene': scene
+        })
+        results['entities'].append(f"scene.{scene}")
+    
+    def _analyze_wait_template_action(self, action: Dict[str, Any], key: str, results: Dict[str, Any]) -> None:
+        """
+        Analyze a wait template action.
+        
+        Args:
+            action (Dict[str, Any]): Action configuration
+            key (str): Action key the action was dispatched on
+            results (Dict[str, Any]): Analysis results to add the action to
+        """
+        results['actions'].append({
+            'type': 'wait_template',
+            'template': action['wait_template']
+        })
+    
+    def _analyze_condition_action(self, action: Dict[str, Any], key: str, results: Dict[str, Any]) -> None:
+        """
+        Analyze a condition action.
+        
+        Args:
+            action (Dict[str, Any]): Action configuration
+            key (str): Action key the action was dispatched on
+            results (Dict[str, Any]): Analysis results to add the action to
+        """
+        results['actions'].append({
+            'type': 'condition',
+            'condition': action['condition']
+        })
+    
+    def _analyze_other_action(self, action: Dict[str, Any], key: str, results: Dict[str, Any]) -> None:
+        """
+        Analyze a device, event, repeat, choose or variables action.
+        
+        Args:
+            action (Dict[str, Any]): Action configuration
+            key (str): Action key the action was dispatched on, which is also its type
+            results (Dict[str, Any]): Analysis results to add the action to
+        """
+        results['actions'].append({
+            'type': key,
+            'details': action[key]
+        })
+    
+    # Analyzer for each key identifying an action type, in order of precedence
+    # when an action has several of the keys
+    _ACTION_ANALYZERS = {
+        'service': _analyze_service_action,
+        'delay': _analyze_delay_action,
+        'scene': _analyze_scene_action,
+        'wait_template': _analyze_wait_template_action,
+        'condition': _analyze_condition_action,
+        'device_id': _analyze_other_action,
+        'event': _analyze_other_action,
+        'repeat': _analyze_other_action,
+        'choose': _analyze_other_action,
+        'variables': _analyze_other_action
+    }
+    
     def _find_templates_in_object(self, obj: Any, path: str = '') -> List[Tuple[str, str]]:
         """
-        Recursively find all template strings in an object.
+        Find all template strings in an object.
         
         Args:
             obj (Any): Object to search
@@ -680,21 +955,31 @@ class AutomationTestRunner:
         """
         templates = []
         
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                new_path = f"{path}.{key}" if path else key
-                
-                # Check if this is a template key
-                if key in ['value_template', 'template', 'wait_template'] and isinstance(value, str):
-                    templates.append((new_path, value))
-                
-                # Recursively check nested objects
-                templates.extend(self._find_templates_in_object(value, new_path))
-                
-        elif isinstance(obj, list):
-            for idx, item in enumerate(obj):
-                new_path = f"{path}[{idx}]"
-                templates.extend(self._find_templates_in_object(item, new_path))
+        # Walk depth first with an explicit stack, pushing children in reverse so
+        # templates come out in document order. Template strings are pushed as
+        # marked entries, and other scalars are never pushed since they hold no templates.
+        stack = [(obj, path, False)]
+        while stack:
+            node, node_path, is_template = stack.pop()
+            
+            if is_template:
+                templates.append((node_path, node))
+            
+            elif type(node) is dict:
+                children = []
+                for key, value in node.items():
+                    if key in _TEMPLATE_KEYS and isinstance(value, str):
+                        children.append((value, f"{node_path}.{key}" if node_path else key, True))
+                    elif type(value) is dict or type(value) is list:
+                        children.append((value, f"{node_path}.{key}" if node_path else key, False))
+                stack.extend(reversed(children))
+            
+            elif type(node) is list:
+                stack.extend(reversed([
+                    (item, f"{node_path}[{idx}]", False)
+                    for idx, item in enumerate(node)
+                    if type(item) is dict or type(item) is list
+                ]))
         
         return templates
     
@@ -715,21 +1000,10 @@ class AutomationTestRunner:
         if open_count != close_count:
             raise ValueError(f"Unbalanced braces: {open_count} opening '{{{{' vs {close_count} closing '}}}}'")
         
-        # Check for unclosed quotes
-        in_quotes = False
-        quote_char = None
-        
-        for char in template:
-            if char in ['"', "'"]:
-                if not in_quotes:
-                    in_quotes = True
-                    quote_char = char
-                elif char == quote_char:
-                    in_quotes = False
-                    quote_char = None
-        
-        if in_quotes:
-            raise ValueError(f"Unclosed {quote_char} quotes")
+        # Check for unclosed quotes, the first quote past the closed prefix has no closing one
+        closed = _CLOSED_QUOTES_RE.match(template).end()
+        if closed < len(template):
+            raise ValueError(f"Unclosed {template[closed]} quotes")
         
         # Additional checks could be added for more complex validation
         # But those would require a full template parser
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Home Assistant Automation Utilities.
+
+This module provides helper functions shared by the automation modules and the web APIs.
+"""
+
+import logging
+import numpy as np
+from datetime import date, time
+from typing import List, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _json_default(obj: Any) -> Any:
+    """
+    Convert values JSON has no type for, such as those from YAML tags like !!set.
+    
+    Args:
+        obj (Any): Value the JSON encoder cannot serialize
+    
+    Returns:
+        Any: A list for sets, an ISO string for dates and times, and str(obj) otherwise
+    """
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    return str(obj)
+
+try:
+    import orjson
+    
+    def json_dumps(obj: Any) -> str:
+        """
+        Serialize automations or tool results to JSON with orjson.
+        
+        Args:
+            obj (Any): Object to serialize
+        
+        Returns:
+            str: JSON text
+        """
+        # Non-string keys (e.g. numeric automation IDs) become strings, as with json.dumps
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    import json
+    
+    def json_dumps(obj: Any) -> str:
+        """
+        Serialize automations or tool results to JSON.
+        
+        Args:
+            obj (Any): Object to serialize
+        
+        Returns:
+            str: JSON text
+        """
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+
+def parse_timestamps_us(values: List[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse a batch of ISO-8601 timestamps into integer microseconds since the epoch.
+    
+    A trailing 'Z' or +HH:MM/-HH:MM offset is split off by slicing, and NumPy parses all
+    wall-clock times in one call. Timestamps without an offset are taken as UTC.
+    
+    Args:
+        values (List[Any]): ISO-8601 timestamp strings (e.g. last_changed values)
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: UTC instants and wall-clock times as int64
+            microseconds, and a mask of the values that could be parsed
+    """
+    try:
+        # Home Assistant reports UTC, so strip the zero offsets in one fast pass
+        local = [v[:-1] if v[-1:] == 'Z' else v[:-6] if v[-6:] == '+00:00' else v for v in values]
+    except TypeError:
+        local = [v[:-1] if v[-1:] == 'Z' else v[:-6] if v[-6:] == '+00:00' else v
+                 for v in (value if isinstance(value, str) else 'NaT' for value in values)]
+    
+    # Split off any other +HH:MM/-HH:MM offset
+    offsets = np.zeros(len(local), dtype=np.int64)
+    for i in [i for i, value in enumerate(local) if value[-3:-2] == ':' and len(value) > 19]:
+        value = local[i]
+        if value[-6] in '+-':
+            try:
+                minutes = int(value[-5:-3]) * 60 + int(value[-2:])
+            except ValueError:
+                local[i] = 'NaT'
+                continue
+            offsets[i] = -minutes if value[-6] == '-' else minutes
+            local[i] = value[:-6]
+    
+    try:
+        wall = np.array(local, dtype='datetime64[us]')
+    except (ValueError, TypeError):
+        # At least one malformed value, fall back to parsing one by one
+        wall = np.empty(len(local), dtype='datetime64[us]')
+        for i, value in enumerate(local):
+            try:
+                wall[i] = np.datetime64(value, 'us')
+            except (ValueError, TypeError):
+                wall[i] = np.datetime64('NaT')
+    
+    valid = ~np.isnat(wall)
+    wall = wall.astype(np.int64)
+    return wall - offsets * 60_000_000, wall, valid
@@ -12,6 +12,12 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Union, Tuple, Set
 
+try:
+    # Decode large state payloads with orjson when it is installed
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 logger = logging.getLogger(__name__)
 
 class HomeAssistantAPI:
@@ -121,26 +127,36 @@ class HomeAssistantAPI:
         url = f"{self.base_url}/api/states"
         async with self.session.get(url, ssl=self.verify_ssl) as response:
             if response.status == 200:
-                return await response.json()
+                return await response.json(loads=_json_loads)
             else:
                 logger.error(f"Failed to get states: {response.status}")
                 return []
     
-    async def get_entity_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
+    async def get_entity_state(self, entity_id: str, missing_ok: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get state of a specific entity.
         
         Args:
             entity_id (str): Entity ID to get state for
+            missing_ok (bool, optional): Return None without logging an error if the entity does
+                not exist, and raise on any other failed request instead of returning None
             
         Returns:
             Optional[Dict[str, Any]]: Entity state or None if not found
+        
+        Raises:
+            aiohttp.ClientResponseError: If missing_ok is set and the request failed for
+                another reason than a missing entity
         """
         await self.connect()
         url = f"{self.base_url}/api/states/{entity_id}"
         async with self.session.get(url, ssl=self.verify_ssl) as response:
             if response.status == 200:
-                return await response.json()
+                return await response.json(loads=_json_loads)
+            elif missing_ok:
+                if response.status == 404:
+                    return None
+                response.raise_for_status()
             else:
                 logger.error(f"Failed to get state for {entity_id}: {response.status}")
                 return None
@@ -23,18 +23,20 @@ logger = logging.getLogger(__name__)
 class ConfigValidator:
     """Class for validating Home Assistant configurations."""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], api: HomeAssistantAPI = None):
         """
         Initialize the configuration validator.
         
         Args:
             config (Dict[str, Any]): Configuration dictionary
+            api (HomeAssistantAPI, optional): Home Assistant API instance to validate against,
+                created on first use if not given
         """
         self.config = config
         self.ha_url = config['home_assistant']['url']
         self.ha_token = config['home_assistant']['token']
-        self.api = None
-        self.advanced_validator = None
+        self.api = api
+        self.advanced_validator = AdvancedValidator(config, api) if api else None
     
     def setup_api(self):
         """
@@ -15,7 +15,7 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Union
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -38,10 +38,12 @@ try:
     # Try relative imports first (for development)
     from .main import load_config
     from .claude_integration.mcp import HomeAssistantMCP
+    from .automation.utils import json_dumps
 except ImportError:
     # Fall back to absolute imports (for production/Railway)
     from src.main import load_config
     from src.claude_integration.mcp import HomeAssistantMCP
+    from src.automation.utils import json_dumps
 
 # Initialize the MCP interface
 config = load_config()
@@ -175,7 +177,8 @@ async def automation_control(request: AutomationRequest):
             "home_assistant_automation", 
             request.dict(exclude_none=True)
         )
-        return result
+        # Automation lists can be large, serialize them with the fast JSON encoder
+        return Response(content=json_dumps(result), media_type="application/json")
     except Exception as e:
         logger.error(f"Error in automation control: {str(e)}")
         raise HTTPException(
@@ -17,7 +17,7 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Union, Callable
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, status, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, status, WebSocket, WebSocketDisconnect, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 from fastapi.openapi.docs import get_swagger_ui_html
@@ -38,6 +38,7 @@ logger = logging.getLogger(__name__)
 # Import Home Assistant MCP components
 from src.main import load_config
 from src.claude_integration.mcp import HomeAssistantMCP
+from src.automation.utils import json_dumps
 
 # ----- WebSocket Connection Manager -----
 
@@ -424,7 +425,8 @@ async def automation_control(request: AutomationRequest, background_tasks: Backg
                 }
             )
         
-        return result
+        # Automation lists can be large, serialize them with the fast JSON encoder
+        return Response(content=json_dumps(result), media_type="application/json")
     except Exception as e:
         logger.error(f"Error in automation control: {str(e)}")
         raise HTTPException(
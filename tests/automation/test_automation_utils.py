@@ -0,0 +1,38 @@
+"""
+Tests for the Home Assistant Automation Utilities.
+"""
+
+import json
+import yaml
+from src.automation.utils import json_dumps, _json_default
+
+class Unknown:
+    """Object JSON has no type for."""
+    
+    def __str__(self):
+        return 'unknown'
+
+def test_json_dumps_yaml_types():
+    """Test serializing values that YAML can produce but JSON has no type for."""
+    automation = yaml.safe_load(
+        "id: tagged\n"
+        "entities: !!set {light.porch: null}\n"
+        "created: 2023-01-01 10:00:00\n"
+        "day: 2023-01-02\n"
+    )
+    automation['offsets'] = (30, 60)
+    
+    expected = {
+        'id': 'tagged',
+        'entities': ['light.porch'],
+        'created': '2023-01-01T10:00:00',
+        'day': '2023-01-02',
+        'offsets': [30, 60]
+    }
+    assert json.loads(json_dumps(automation)) == expected
+    
+    # The json fallback used without orjson gives the same result
+    assert json.loads(json.dumps(automation, default=_json_default)) == expected
+    
+    # Anything else is written as its string form
+    assert json.loads(json_dumps({'path': Unknown()})) == {'path': 'unknown'}
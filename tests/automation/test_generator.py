@@ -6,7 +6,7 @@ import pytest
 import yaml
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
-from src.automation.generator import AutomationGenerator
+from src.automation.generator import AutomationGenerator, Pattern
 
 @pytest.fixture
 def config():
@@ -49,14 +49,33 @@ def test_find_time_patterns(generator):
         }
     ]
     
-    patterns = generator._find_time_patterns(entity_id, history)
+    patterns = generator._find_time_patterns(entity_id, generator._parse_entity_history({entity_id: history})[entity_id])
     
     assert len(patterns) == 1
-    assert patterns[0]['entity_id'] == entity_id
-    assert patterns[0]['type'] == 'time'
-    assert patterns[0]['trigger_time'] == "07:00"
-    assert patterns[0]['action_state'] == "on"
-    assert patterns[0]['confidence'] >= 0.7
+    assert patterns[0].entity_id == entity_id
+    assert patterns[0].type == 'time'
+    assert patterns[0].trigger_time == "07:00"
+    assert patterns[0].action_state == "on"
+    assert patterns[0].confidence >= 0.7
+
+def test_find_time_patterns_first_seen_order(generator):
+    """Test that time patterns come out in the order their hours first appear."""
+    entity_id = "light.living_room"
+    history = []
+    for day in (1, 2, 3):
+        history.append({"entity_id": entity_id, "state": "on", "last_changed": f"2023-01-0{day}T18:01:00.000Z"})
+        history.append({"entity_id": entity_id, "state": "off", "last_changed": f"2023-01-0{day + 1}T07:01:00.000Z"})
+    
+    patterns = generator._find_time_patterns(entity_id, generator._parse_entity_history({entity_id: history})[entity_id])
+    
+    assert [pattern.trigger_time for pattern in patterns] == ["18:00", "07:00"]
+    
+    # The order comes from the history, even when it is not chronological
+    patterns = generator._find_time_patterns(
+        entity_id, generator._parse_entity_history({entity_id: history[1:] + history[:1]})[entity_id]
+    )
+    
+    assert [pattern.trigger_time for pattern in patterns] == ["07:00", "18:00"]
 
 def test_find_state_patterns(generator):
     """Test finding state-based patterns."""
@@ -105,15 +124,103 @@ def test_find_state_patterns(generator):
         trigger_entity_id: trigger_history
     }
     
-    patterns = generator._find_state_patterns(entity_id, entity_history, all_entity_history)
+    parsed_history = generator._parse_entity_history(all_entity_history)
+    
+    patterns = generator._find_state_patterns(
+        entity_id, parsed_history[entity_id], generator._viable_triggers(parsed_history)
+    )
     
     assert len(patterns) == 1
-    assert patterns[0]['entity_id'] == entity_id
-    assert patterns[0]['type'] == 'state'
-    assert patterns[0]['trigger_entity'] == trigger_entity_id
-    assert patterns[0]['trigger_state'] == "on"
-    assert patterns[0]['action_state'] == "on"
-    assert patterns[0]['confidence'] >= 0.7
+    assert patterns[0].entity_id == entity_id
+    assert patterns[0].type == 'state'
+    assert patterns[0].trigger_entity == trigger_entity_id
+    assert patterns[0].trigger_state == "on"
+    assert patterns[0].action_state == "on"
+    assert patterns[0].confidence >= 0.7
+
+def test_find_state_patterns_first_seen_order(generator):
+    """Test that state patterns come out in the order their trigger states first appear in the history."""
+    entity_id = "light.living_room"
+    trigger_entity_id = "person.alice"
+    entity_history = []
+    trigger_history = []
+    for day in (1, 2, 3):
+        for hour, state in ((8, "not_home"), (18, "home")):
+            trigger_history.append({"entity_id": trigger_entity_id, "state": state, "last_changed": f"2023-01-0{day}T{hour:02d}:00:00Z"})
+            entity_history.append({"entity_id": entity_id, "state": "on", "last_changed": f"2023-01-0{day}T{hour:02d}:00:30Z"})
+    
+    for history, expected in ((trigger_history, ["not_home", "home"]), (trigger_history[::-1], ["home", "not_home"])):
+        parsed_history = generator._parse_entity_history({entity_id: entity_history, trigger_entity_id: history})
+        patterns = generator._find_state_patterns(
+            entity_id, parsed_history[entity_id], generator._viable_triggers(parsed_history)
+        )
+        
+        assert [pattern.trigger_state for pattern in patterns] == expected
+
+def test_find_state_patterns_mixed_offsets(generator):
+    """Test that state correlation compares instants, not wall-clock times."""
+    entity_id = "light.living_room"
+    trigger_entity_id = "binary_sensor.motion"
+    
+    # Same wall-clock times as the trigger, but two hours earlier
+    late_history = [
+        {"entity_id": entity_id, "state": "on", "last_changed": f"2023-01-0{day}T18:00:30+02:00"}
+        for day in (1, 2, 3)
+    ]
+    
+    # Different wall-clock times, but 30 seconds after the trigger
+    shifted_history = [
+        {"entity_id": entity_id, "state": "on", "last_changed": f"2023-01-0{day}T20:00:30+02:00"}
+        for day in (1, 2, 3)
+    ]
+    
+    trigger_history = [
+        {"entity_id": trigger_entity_id, "state": "on", "last_changed": f"2023-01-0{day}T18:00:00Z"}
+        for day in (1, 2, 3)
+    ]
+    
+    for history, expected in ((late_history, 0), (shifted_history, 1)):
+        parsed_history = generator._parse_entity_history({
+            entity_id: history,
+            trigger_entity_id: trigger_history
+        })
+        patterns = generator._find_state_patterns(
+            entity_id, parsed_history[entity_id], generator._viable_triggers(parsed_history)
+        )
+        
+        assert len(patterns) == expected
+    
+    # Time patterns still use the hour written in the timestamp
+    time_patterns = generator._find_time_patterns(entity_id, parsed_history[entity_id])
+    assert [pattern.trigger_time for pattern in time_patterns] == ["20:00"]
+
+def test_pattern_to_dict():
+    """Test converting patterns to the dictionary format."""
+    time_pattern = Pattern(
+        entity_id='light.living_room',
+        type='time',
+        trigger_time='07:00',
+        action_state='on',
+        confidence=0.9,
+        occurrences=5
+    )
+    state_pattern = Pattern(
+        entity_id='light.kitchen',
+        type='state',
+        trigger_entity='binary_sensor.kitchen_motion',
+        trigger_state='on',
+        action_state='on',
+        confidence=1.0,
+        occurrences=3
+    )
+    
+    assert list(time_pattern.to_dict()) == [
+        'entity_id', 'type', 'trigger_time', 'action_state', 'confidence', 'occurrences'
+    ]
+    assert list(state_pattern.to_dict()) == [
+        'entity_id', 'type', 'trigger_entity', 'trigger_state', 'action_state', 'confidence', 'occurrences'
+    ]
+    assert state_pattern.to_dict()['trigger_entity'] == 'binary_sensor.kitchen_motion'
 
 def test_analyze_entity_usage(generator):
     """Test analyzing entity usage patterns in a simplified way."""
@@ -0,0 +1,249 @@
+"""
+Tests for the Home Assistant Automation Manager.
+"""
+
+import os
+import pickle
+import pytest
+import yaml
+from unittest.mock import patch
+from src.automation import manager as manager_module
+from src.automation.manager import AutomationManager
+
+class OfflineAPI:
+    """API stub whose service calls always fail, so changes fall back to the YAML."""
+    
+    async def call_service(self, service, data):
+        raise RuntimeError("offline")
+
+@pytest.fixture
+def automations_file(tmp_path):
+    """Fixture for an automations.yaml in the layout written by yaml.dump."""
+    path = tmp_path / 'automations.yaml'
+    automations = [
+        {
+            'id': '0123',
+            'alias': 'Lights: on at dusk',
+            'trigger': {'platform': 'sun', 'event': 'sunset'},
+            'action': [{'service': 'light.turn_on', 'enabled': False, 'target': {'entity_id': 'light.porch'}}]
+        },
+        {
+            'id': 'night',
+            'alias': 'Night mode',
+            'enabled': True,
+            'trigger': {'platform': 'time', 'at': '23:00'},
+            'action': {'service': 'scene.turn_on', 'target': {'entity_id': 'scene.night'}}
+        }
+    ]
+    path.write_text('# Managed by hand\n' + yaml.safe_dump(automations, sort_keys=False, default_flow_style=False))
+    return path
+
+@pytest.fixture
+def manager(automations_file):
+    """Fixture for an AutomationManager reading the automations file."""
+    config = {'home_assistant': {'automations_path': str(automations_file)}}
+    return AutomationManager(config, OfflineAPI())
+
+def _load(path):
+    return {auto['id']: auto for auto in yaml.safe_load(path.read_text())}
+
+@pytest.mark.asyncio
+async def test_enable_disable_round_trip(manager, automations_file):
+    """Test that toggling an automation patches only its enabled key."""
+    assert await manager.enable_disable_automation('night', False)
+    assert _load(automations_file)['night']['enabled'] is False
+    
+    assert await manager.enable_disable_automation('night', True)
+    assert automations_file.read_text().startswith('# Managed by hand\n')
+    assert _load(automations_file) == await manager.load_automations(refresh=True)
+    assert _load(automations_file)['night']['enabled'] is True
+
+@pytest.mark.asyncio
+async def test_enable_disable_quoted_id_and_nested_enabled(manager, automations_file):
+    """Test patching an automation with a quoted ID and an enabled key in its actions."""
+    assert await manager.enable_disable_automation('0123', False)
+    
+    automation = _load(automations_file)['0123']
+    assert automation['enabled'] is False
+    assert automation['action'][0]['enabled'] is False
+    assert automations_file.read_text().startswith('# Managed by hand\n')
+    
+    assert await manager.enable_disable_automation('0123', True)
+    
+    automation = _load(automations_file)['0123']
+    assert automation['enabled'] is True
+    assert automation['action'][0]['enabled'] is False
+    assert automation['alias'] == 'Lights: on at dusk'
+
+@pytest.mark.asyncio
+async def test_parse_cache_invalidation(manager, automations_file):
+    """Test that the pickle sidecar is only used while the YAML is unchanged."""
+    sidecar = automations_file.with_name(automations_file.name + '.pkl')
+    
+    await manager.load_automations()
+    assert sidecar.exists()
+    
+    # Editing the YAML changes its signature, so the sidecar is stale
+    automations = _load(automations_file)
+    automations['night']['alias'] = 'Night mode, renamed by hand'
+    automations_file.write_text(yaml.safe_dump(list(automations.values()), sort_keys=False))
+    assert (await manager.load_automations(refresh=True))['night']['alias'] == 'Night mode, renamed by hand'
+    assert sidecar.exists()
+    
+    # Patching the YAML drops the sidecar, and a fresh manager sees the patch
+    assert await manager.enable_disable_automation('night', False)
+    assert not sidecar.exists()
+    
+    config = {'home_assistant': {'automations_path': str(automations_file)}}
+    reloaded = await AutomationManager(config, OfflineAPI()).load_automations()
+    assert reloaded['night']['enabled'] is False
+
+@pytest.fixture
+def automations_dir(tmp_path):
+    """Fixture for an automations directory with one file per automation, named after its ID."""
+    directory = tmp_path / 'automations'
+    directory.mkdir()
+    for auto_id, alias, hour in (('porch', 'Porch light', '19:00'), ('night', 'Night mode', '23:00')):
+        automation = {'id': auto_id, 'alias': alias, 'trigger': {'platform': 'time', 'at': hour}}
+        (directory / f'{auto_id}.yaml').write_text(yaml.safe_dump(automation, sort_keys=False))
+    return directory
+
+def _directory_manager(directory):
+    return AutomationManager({'home_assistant': {'automations_path': str(directory)}}, OfflineAPI())
+
+@pytest.mark.asyncio
+async def test_parse_cache_ignores_foreign_pickle(automations_dir):
+    """Test that a sidecar not written by the manager is reparsed instead of losing automations."""
+    sidecar = automations_dir.with_name('automations.pkl')
+    manager = _directory_manager(automations_dir)
+    
+    for cached in (['porch'], {'signature': manager._source_signature(), 'automations': ['porch']}):
+        sidecar.write_bytes(pickle.dumps(cached))
+        assert sorted(await manager.load_automations(refresh=True)) == ['night', 'porch']
+        
+        # The miss rewrites the sidecar in the expected layout
+        assert sorted(pickle.loads(sidecar.read_bytes())['automations']) == ['night', 'porch']
+    
+    # So saving keeps the automations that were not touched
+    assert await manager.save_automation({'id': 'porch', 'alias': 'Porch light, renamed'})
+    assert sorted(path.name for path in automations_dir.glob('*.yaml')) == ['night.yaml', 'porch.yaml']
+
+@pytest.mark.asyncio
+async def test_parse_cache_not_written_after_failed_file(automations_dir):
+    """Test that automations parsed around a broken file are not cached."""
+    sidecar = automations_dir.with_name('automations.pkl')
+    (automations_dir / 'broken.yaml').write_text('alias: [unclosed\n')
+    
+    assert sorted(await _directory_manager(automations_dir).load_automations()) == ['night', 'porch']
+    assert not sidecar.exists()
+    
+    # Once the file is fixed the whole directory is cached again
+    (automations_dir / 'broken.yaml').write_text(yaml.safe_dump({'id': 'fixed', 'alias': 'Fixed'}))
+    assert sorted(await _directory_manager(automations_dir).load_automations()) == ['fixed', 'night', 'porch']
+    assert sidecar.exists()
+
+@pytest.fixture
+def written(monkeypatch):
+    """Fixture recording the name of every file the manager writes."""
+    names = []
+    write_file = manager_module._write_file
+    
+    def record(item):
+        names.append(os.path.basename(item[0]))
+        write_file(item)
+    
+    monkeypatch.setattr(manager_module, '_write_file', record)
+    return names
+
+def _load_directory(directory):
+    return {path.name: yaml.safe_load(path.read_text()) for path in sorted(directory.glob('*.yaml'))}
+
+@pytest.mark.asyncio
+async def test_directory_save_writes_only_changes(automations_dir, written):
+    """Test that saving a directory rewrites changed files and leaves unchanged ones alone."""
+    manager = _directory_manager(automations_dir)
+    night = (automations_dir / 'night.yaml').stat()
+    
+    # Changed: only that automation's file is written
+    assert await manager.save_automation({'id': 'porch', 'alias': 'Porch light, dimmed'})
+    assert written == ['porch.yaml']
+    assert _load_directory(automations_dir)['porch.yaml'] == {'id': 'porch', 'alias': 'Porch light, dimmed'}
+    
+    # Unchanged: saving the same automations again writes nothing
+    assert await manager.save_automation({'id': 'porch', 'alias': 'Porch light, dimmed'})
+    assert written == ['porch.yaml']
+    assert (automations_dir / 'night.yaml').stat().st_mtime_ns == night.st_mtime_ns
+    
+    # Renamed: the automation moves to a file named after its new ID
+    automations = await manager.load_automations()
+    automations['porch_light'] = dict(automations.pop('porch'), id='porch_light')
+    assert manager._save_automations_to_file(automations)
+    assert written == ['porch.yaml', 'porch_light.yaml']
+    assert sorted(_load_directory(automations_dir)) == ['night.yaml', 'porch_light.yaml']
+    
+    # Deleted: its file is removed and the others are kept
+    assert await manager.delete_automation('night')
+    assert written == ['porch.yaml', 'porch_light.yaml']
+    assert _load_directory(automations_dir) == {'porch_light.yaml': {'id': 'porch_light', 'alias': 'Porch light, dimmed'}}
+
+@pytest.mark.asyncio
+async def test_directory_save_after_parse_cache_hit(automations_dir, written):
+    """Test saving automations that were loaded from the pickle sidecar instead of the YAML."""
+    sidecar = automations_dir.with_name('automations.pkl')
+    await _directory_manager(automations_dir).load_automations()
+    assert sidecar.exists()
+    
+    manager = _directory_manager(automations_dir)
+    with patch.object(manager, '_load_yaml_directory') as load_yaml_directory:
+        assert sorted(await manager.load_automations()) == ['night', 'porch']
+        load_yaml_directory.assert_not_called()
+    
+    assert await manager.save_automation({'id': 'porch', 'alias': 'Porch light, dimmed'})
+    assert 'porch.yaml' in written
+    assert not sidecar.exists()
+    
+    files = _load_directory(automations_dir)
+    assert files['porch.yaml'] == {'id': 'porch', 'alias': 'Porch light, dimmed'}
+    assert files['night.yaml'] == {'id': 'night', 'alias': 'Night mode', 'trigger': {'platform': 'time', 'at': '23:00'}}
+    
+    # A new manager parses the saved YAML, not the old sidecar
+    reloaded = await _directory_manager(automations_dir).load_automations()
+    assert reloaded['porch']['alias'] == 'Porch light, dimmed'
+
+class FlakyAPI:
+    """API stub whose automation listing fails until it is told to recover."""
+    
+    def __init__(self):
+        self.calls = 0
+        self.available = False
+    
+    async def get_automations(self):
+        self.calls += 1
+        if not self.available:
+            raise RuntimeError("offline")
+        return [{'id': 'api_auto', 'alias': 'From the API'}]
+
+@pytest.mark.asyncio
+async def test_api_backoff_survives_directory_reload(tmp_path):
+    """Test that reloading the YAML directory does not reset the API backoff."""
+    directory = tmp_path / 'automations'
+    directory.mkdir()
+    (directory / 'porch.yaml').write_text(yaml.safe_dump({'id': 'porch', 'alias': 'Porch light'}))
+    
+    api = FlakyAPI()
+    manager = AutomationManager({'home_assistant': {'automations_path': str(directory)}}, api)
+    
+    assert list(await manager.load_automations()) == ['porch']
+    assert api.calls == 1
+    assert manager.api_failures == 1
+    
+    # Still backing off, so the reload goes straight to the directory
+    assert list(await manager.load_automations(refresh=True)) == ['porch']
+    assert api.calls == 1
+    assert manager.api_failures == 1
+    
+    # Only a successful listing clears the failures
+    api.available = True
+    manager.api_retry_at = 0.0
+    assert list(await manager.load_automations(refresh=True)) == ['api_auto']
+    assert manager.api_failures == 0
@@ -0,0 +1,37 @@
+"""
+Tests for the Home Assistant Advanced Pattern Discovery.
+"""
+
+import pytest
+from unittest.mock import patch
+from src.automation.pattern_discovery import PatternDiscovery
+
+@pytest.fixture
+def discovery():
+    """Fixture for PatternDiscovery instance."""
+    return PatternDiscovery({'automation': {'min_occurrences': 3, 'confidence_threshold': 0.7}})
+
+@pytest.fixture
+def entity_history():
+    """Fixture for a week of a light turning on every evening."""
+    entity_id = "light.living_room"
+    return {
+        entity_id: [
+            {"entity_id": entity_id, "state": "on", "last_changed": f"2023-01-0{day}T18:00:00.000Z"}
+            for day in range(1, 8)
+        ]
+    }
+
+def test_history_cache_misses_on_middle_edit(discovery, entity_history):
+    """Test that editing an entry in the middle of the history invalidates the caches."""
+    with patch.object(discovery, '_parse_timeline', wraps=discovery._parse_timeline) as parse:
+        first = discovery.discover_daily_patterns(entity_history)
+        assert discovery.discover_daily_patterns(entity_history) == first
+        assert parse.call_count == 1
+        
+        # Same length and same last entry, only a middle entry changes
+        entity_history["light.living_room"][3]["state"] = "off"
+        discovery.discover_daily_patterns(entity_history)
+        assert parse.call_count == 2
+    
+    assert discovery._build_timeline(entity_history).states == ["on", "off"]
@@ -0,0 +1,51 @@
+"""
+Tests for the Home Assistant Automation Suggestion Engine.
+"""
+
+import pytest
+import yaml
+from src.automation.suggestion_engine import _dump_automation, YamlDumper
+
+# Scalars the YAML resolver reads as another type unless they are quoted, and others the
+# template has to write exactly as the emitter does
+SCALARS = [
+    'on', 'off', 'yes', 'No', 'true', 'null', '~', '', '10:00:00', '12:30', '1_000', '0x1F', '0o17',
+    '1.5', '.inf', '-1', '+1', '1e3', '2023-01-01', 'light.porch', 'sensor.a_b', '/config/www',
+    'two words', 'trailing ', 'colon:', 'key: value', '# comment', "it's", '"quoted"', '- item',
+    '*alias', '&anchor', '!tag', '%percent', '@at', '`tick', 'multi\nline', 'café', 0, 7, -3,
+    1.5, True, False, None
+]
+
+def _automation(value):
+    """Build an automation in the shape of a suggestion, with value in every scalar position."""
+    return {
+        'id': 'suggestion_light_porch',
+        'alias': value,
+        'description': 'Suggested from the history of light.porch',
+        'trigger': [{'platform': 'state', 'entity_id': 'binary_sensor.motion', 'to': value}],
+        'condition': [],
+        'action': [{'service': 'light.turn_on', 'target': {'entity_id': 'light.porch'}, 'data': {'state': value}}]
+    }
+
+def _yaml_dump(automation):
+    return yaml.dump(automation, Dumper=YamlDumper, sort_keys=False, default_flow_style=False)
+
+@pytest.mark.parametrize('value', SCALARS, ids=repr)
+def test_dump_automation_matches_yaml_dump(value):
+    """Test that the template output is byte for byte what yaml.dump writes."""
+    automation = _automation(value)
+    
+    assert _dump_automation(automation) == _yaml_dump(automation)
+    
+    # Dumping a second automation of the same shape reuses the template
+    assert _dump_automation(_automation('off')) == _yaml_dump(_automation('off'))
+
+@pytest.mark.parametrize('width', [60, 70, 78, 79, 80, 81, 82, 90, 120])
+def test_dump_automation_long_lines(width):
+    """Test lines around the emitter's 80 column width, which it folds at spaces."""
+    words = ('Turn on the porch light when motion is detected after sunset ' * 3)[:width]
+    automation = _automation(words.strip())
+    automation['description'] = 'x' * width
+    
+    assert _dump_automation(automation) == _yaml_dump(automation)
+    assert yaml.safe_load(_dump_automation(automation)) == automation
@@ -0,0 +1,101 @@
+"""
+Tests for the Home Assistant Automation Test Runner.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.automation.test_runner import AutomationTestRunner
+
+AUTOMATION_YAML = """
+id: evening_lights
+alias: Evening lights
+trigger:
+  platform: state
+  entity_id: binary_sensor.motion
+  to: 'on'
+action:
+  service: light.turn_on
+  entity_id: light.living_room
+  data:
+    brightness: 128
+"""
+
+@pytest.fixture
+def config():
+    """Fixture for test runner configuration."""
+    return {
+        'home_assistant': {
+            'url': 'http://test.local:8123',
+            'token': 'test_token'
+        }
+    }
+
+@pytest.fixture
+def test_runner(config):
+    """Fixture for AutomationTestRunner instance with a mock API."""
+    return AutomationTestRunner(config, AsyncMock())
+
+@pytest.mark.asyncio
+async def test_results_do_not_share_the_parsed_document(test_runner):
+    """Test that changing one call's results does not change the next call's."""
+    dry_run = await test_runner.dry_run_automation(AUTOMATION_YAML)
+    dry_run['actions'][0]['data']['brightness'] = 999
+    
+    trigger = await test_runner.test_automation_trigger(AUTOMATION_YAML)
+    trigger['test_entity'] = 'binary_sensor.other'
+    
+    assert (await test_runner.dry_run_automation(AUTOMATION_YAML))['actions'][0]['data'] == {'brightness': 128}
+    assert (await test_runner.test_automation_trigger(AUTOMATION_YAML))['test_entity'] == 'binary_sensor.motion'
+
+@pytest.mark.asyncio
+async def test_validation_against_api_expires(test_runner, monkeypatch):
+    """Test that only results that do not depend on the API are cached indefinitely."""
+    validator = MagicMock()
+    validator.validate_automation_config.side_effect = lambda automation_yaml: (
+        (True, None) if 'trigger' in automation_yaml else (False, "Missing trigger")
+    )
+    validator.validate_config_against_api = AsyncMock(return_value={'valid': True, 'invalid_entities': []})
+    test_runner.validator = validator
+    
+    await test_runner.validate_automation_yaml(AUTOMATION_YAML)
+    await test_runner.validate_automation_yaml(AUTOMATION_YAML)
+    assert validator.validate_config_against_api.await_count == 1
+    
+    # Once expired, the API is asked again, for instance about entities added since
+    monkeypatch.setattr('src.automation.test_runner._API_RESULT_TTL', 0.0)
+    await test_runner.validate_automation_yaml(AUTOMATION_YAML + "mode: single\n")
+    await test_runner.validate_automation_yaml(AUTOMATION_YAML + "mode: single\n")
+    assert validator.validate_config_against_api.await_count == 3
+    
+    # YAML that fails the local checks never reaches the API
+    for _ in range(2):
+        results = await test_runner.validate_automation_yaml("alias: Broken\n")
+        assert results['errors'] == ["Missing trigger"]
+    assert validator.validate_automation_config.call_count == 4
+
+@pytest.mark.asyncio
+async def test_simulation_warns_when_a_state_fetch_fails(test_runner):
+    """Test that a missing entity is a placeholder state but a failed fetch is a warning."""
+    test_runner.api.get_entity_state = AsyncMock(return_value=None)
+    
+    results = await test_runner.simulate_automation_execution(AUTOMATION_YAML)
+    assert results['warning'] is None
+    assert results['steps'][1]['old_state'] == "unknown"
+    test_runner.api.get_entity_state.assert_awaited_once_with('light.living_room', missing_ok=True)
+    
+    test_runner.api.get_entity_state = AsyncMock(side_effect=RuntimeError("Server error"))
+    
+    results = await test_runner.simulate_automation_execution(AUTOMATION_YAML)
+    assert results['success']
+    assert results['warning'] == "Could not get current entity states. Using placeholders."
+
+def test_validator_shares_the_runner_api(config):
+    """Test that the validator validates against the runner's API instead of opening its own."""
+    api = AsyncMock()
+    test_runner = AutomationTestRunner(config, api)
+    
+    assert test_runner.validator.api is api
+    assert test_runner.validator.advanced_validator.api is api
+    
+    validator = MagicMock()
+    assert AutomationTestRunner(config, api, validator).validator is validator
@@ -74,6 +74,28 @@ async def test_get_entity_state(api_client):
         assert result['state'] == 'on'
         assert mock_get_state.called
 
+@pytest.mark.asyncio
+async def test_get_entity_state_missing_ok(api_client, caplog):
+    """Test that missing_ok only tolerates a missing entity."""
+    response = MagicMock()
+    api_client.session = MagicMock()
+    api_client.session.get.return_value.__aenter__ = AsyncMock(return_value=response)
+    api_client.session.get.return_value.__aexit__ = AsyncMock(return_value=False)
+    
+    with patch.object(HomeAssistantAPI, 'connect', AsyncMock()):
+        response.status = 404
+        assert await api_client.get_entity_state('light.missing', missing_ok=True) is None
+        assert not caplog.records
+        
+        response.status = 500
+        response.raise_for_status.side_effect = aiohttp.ClientResponseError(MagicMock(), (), status=500)
+        with pytest.raises(aiohttp.ClientResponseError):
+            await api_client.get_entity_state('light.test', missing_ok=True)
+        
+        # Without missing_ok, any failure is logged and returns None
+        assert await api_client.get_entity_state('light.test') is None
+        assert caplog.records[-1].levelname == 'ERROR'
+
 @pytest.mark.asyncio
 async def test_call_service(api_client):
     """Test call_service method."""